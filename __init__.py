@@ -16,19 +16,48 @@
 from adapt.intent import IntentBuilder
 from mycroft import intent_handler, intent_file_handler
 from mycroft.api import DeviceApi
+from mycroft.messagebus.message import Message
 from mycroft.skills.core import FallbackSkill
+from mycroft.util.format import join_list
 from mycroft.util.log import LOG
 #from mycroft.util.parse import match_one
 
 # from os.path import dirname, join
-from rapidfuzz import fuzz
-import re
+from os.path import join
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import json
+import queue
+import sqlite3
+import threading
+from rapidfuzz import fuzz, process
 import fhem as python_fhem
 
+from .fhemskill.cache import DeviceCache, DEFAULT_TTL
+from .fhemskill.client import FhemClient
+from .fhemskill.context import DeviceContext, Handle, room_targets
+from .fhemskill.daemon import DaemonClient, CLIENT_TTL
+from .fhemskill.dimmer import (adjust_level, dim_command, dim_value,
+                               level_max)
+from .fhemskill.entities import NameIndex, write_entity
+from .fhemskill.health import CircuitBreaker, Watchdog
+from .fhemskill.history import History, period, source_for
+from .fhemskill.matching import match_device, match_person, remove_words
+from .fhemskill.metrics import MetricsRegistry, MetricsServer, render_json
+from .fhemskill.names import normalize
+from .fhemskill.events import parse_event
+from .fhemskill.notify import Notifier, Rule, parse_quiet_hours
+from .fhemskill.profiling import Profiler, parse_options, profiled
+from .fhemskill.records import KEPT_READINGS
+from .fhemskill.scenes import SceneIndex
+from .fhemskill.state import Connection, SharedState, pinned
+from .fhemskill.status import collect, majority, ranges
+from .fhemskill.sync import DeltaSync
+
 __author__ = 'domcross'
 
-REQUIRED_RATIO_FOR_BONUS = 89
-BONUS = 25
+# seconds between checks of the FHEM server
+DEFAULT_HEARTBEAT = 30
 
 
 class FhemSkill(FallbackSkill):
@@ -36,77 +65,270 @@ class FhemSkill(FallbackSkill):
     def __init__(self):
         super(FhemSkill, self).__init__(name="FhemSkill")
         LOG.info("__init__")
-        self.fhem = None
-        self.enable_fallback = False
-        self.device_location = ""
+        # the connection and everything derived from the settings,
+        # see the properties below
+        self.state = SharedState()
+        self._setup_lock = threading.Lock()
+        # (device cache, its generation, SceneIndex)
+        self.scene_index = (None, None, None)
+        # (device cache, its generation, NameIndex)
+        self.name_index = (None, None, None)
+        # of the names in the registered device and room entities
+        self.entity_fingerprint = None
+        self._entity_lock = threading.Lock()
+        # per thread, e.g. the outcome of the current fallback
+        self._local = threading.local()
+        self.device_context = DeviceContext()
+        self.metrics = MetricsRegistry()
+        self.metrics.gauge('fhem_up', 'FHEM server reachable (1) or not (0)',
+                           func=lambda: int(self.fhem is not None and
+                                            self.fhem.available()))
+        self.metrics.gauge('fhem_cache_devices',
+                           'Devices in the device cache',
+                           func=lambda: len(self.device_cache or []))
+        self.metrics_server = None
+        self.metrics_dump_interval = 0
+        self.profiler = Profiler(join(self.file_system.path, 'profiles'))
+        self.profile_calls = 0
+        self.watchdog = None
+        self.notifier = None
+        self.event_queue = None
+        self.events = queue.Queue()
+        self.events_thread = None
+
+    # read only views of the current (or the pinned) connection, they
+    # are replaced as a whole by _setup
+    @property
+    def fhem(self):
+        return self.state.current().fhem
+
+    @property
+    def device_cache(self):
+        return self.state.current().device_cache
+
+    @property
+    def device_sync(self):
+        return self.state.current().device_sync
+
+    @property
+    def allowed_devices_room(self):
+        return self.state.current().allowed_devices_room
+
+    @property
+    def ignore_rooms(self):
+        return self.state.current().ignore_rooms
+
+    @property
+    def enable_fallback(self):
+        return self.state.current().enable_fallback
+
+    @property
+    def fallback_device_name(self):
+        return self.state.current().fallback_device_name
+
+    @property
+    def fallback_device_type(self):
+        return self.state.current().fallback_device_type
+
+    @property
+    def device_location(self):
+        return self.state.current().device_location
+
+    @property
+    def history(self):
+        return self.state.current().history
+
+    @property
+    def fallback_outcome(self):
+        return getattr(self._local, 'fallback_outcome', None)
+
+    @fallback_outcome.setter
+    def fallback_outcome(self, outcome):
+        self._local.fallback_outcome = outcome
 
     def _setup(self, force=False):
-        # when description of home.mycroft.ai > Devices > [this mycroft device]
-        # is filled, use this the name of the room where mycroft is located
+        # also retried when FHEM was down during the last setup, in case
+        # no heartbeat noticed it is back
+        if not self.settings or \
+                not (force or self.fhem is None or self.device_cache is None):
+            return
+        with self._setup_lock:
+            # another intent may have done the setup while we waited
+            current = self.state.current()
+            if force or current.fhem is None or current.device_cache is None:
+                self.state.swap(self._connect())
+
+    def _connect(self):
+        """Return a new Connection built from the settings.
+
+        Without a cache daemon this takes three sequential requests to
+        FHEM: connecting (which also fetches the csrf token), the delta
+        query and the jsonlist2 load of the devices, which includes the
+        fallback device. The device location is fetched alongside.
+        """
+        LOG.debug("_setup")
+        # the device location comes from home.mycroft.ai, fetch it
+        # while connecting to the FHEM server
+        location = None
         if self.settings.get('device_location', False):
-            dev = DeviceApi()
-            info = dev.get()
-            if 'description' in info:
-                self.device_location = info['description']
-        LOG.debug("mycroft device location: {}".format(self.device_location))
-
-        if self.settings and (force or self.fhem is None):
-            LOG.debug("_setup")
-            portnumber = self.settings.get('portnum')
+            executor = ThreadPoolExecutor(max_workers=1)
+            location = executor.submit(self._get_device_location)
+            executor.shutdown(wait=False)
+
+        portnumber = self.settings.get('portnum')
+        try:
+            portnumber = int(portnumber)
+        except TypeError:
+            portnumber = 8083
+        except ValueError:
+            # String might be some rubbish (like '')
+            portnumber = 0
+
+        try:
+            timeout = float(self.settings.get('request_timeout') or 0)
+        except ValueError:
+            timeout = 0
+        fhem = FhemClient(
+            python_fhem.Fhem(self.settings.get('host'),
+                             port=portnumber,  csrf=True,
+                             protocol=self.settings.get('protocol',
+                                                        'http').lower(),
+                             use_ssl=self.settings.get('ssl', False),
+                             username=self.settings.get('username'),
+                             password=self.settings.get('password')
+                             ), self.metrics, breaker=CircuitBreaker(),
+            timeout=timeout or None)
+        fhem.connect()
+        LOG.debug("connect: {}".format(fhem.connected()))
+        daemon = self.settings.get('cache_daemon')
+        daemon_client = DaemonClient(daemon) if daemon else None
+        # FileLog files (glob pattern) or DbLog SQLite database,
+        # readable by the skill
+        history_source = self.settings.get('history_source', '')
+        connection = Connection(
+            fhem=fhem, device_cache=None, device_sync=None,
+            allowed_devices_room=self.settings.get('room', 'Homebridge'),
+            ignore_rooms=self.settings.get('ignore_rooms', ''),
+            enable_fallback=False, fallback_device_name="",
+            fallback_device_type=None,
+            device_location=self.device_location,
+            history=History(source_for(history_source))
+            if history_source else None)
+        if fhem.connected():
             try:
-                portnumber = int(portnumber)
-            except TypeError:
-                portnumber = 8083
-            except ValueError:
-                # String might be some rubbish (like '')
-                portnumber = 0
-
-            self.fhem = \
-                python_fhem.Fhem(self.settings.get('host'),
-                                 port=portnumber,  csrf=True,
-                                 protocol=self.settings.get('protocol',
-                                                            'http').lower(),
-                                 use_ssl=self.settings.get('ssl', False),
-                                 username=self.settings.get('username'),
-                                 password=self.settings.get('password')
-                                 )
-            self.fhem.connect()
-            LOG.debug("connect: {}".format(self.fhem.connected()))
-            if self.fhem.connected():
-                self.allowed_devices_room = self.settings.get('room', 'Homebridge')
-                self.ignore_rooms = self.settings.get('ignore_rooms', '')
-
-                # Check if natural language control is loaded at fhem-server
-                # and activate fallback accordingly
-                LOG.debug("fallback_device_name %s" %
-                          self.settings.get('fallback_device_name'))
-                LOG.debug("enable_fallback %s" %
-                          self.settings.get('enable_fallback'))
-                if self.settings.get('enable_fallback') and \
-                   self.settings.get('fallback_device_name', ""):
-                    fallback_device = \
-                        self.fhem.get_device(self.settings.get(
-                            'fallback_device_name', ""))
-                    if fallback_device:
-                        # LOG.debug("fallback device {}".format(fallback_device))
-                        self.fallback_device_name = self.settings.get(
-                            'fallback_device_name', "")
-                        self.fallback_device_type = self.fhem.get_internals(
-                            "TYPE", name=self.fallback_device_name)[
-                                self.fallback_device_name]
-                        LOG.debug("fallback_device_type is %s" %
-                                  self.fallback_device_type)
-                        if self.fallback_device_type in ["Talk2Fhem",
-                                                         "TEERKO",
-                                                         "Babble"]:
-                            self.enable_fallback = True
-                        else:
-                            self.enable_fallback = False
-                else:
-                    self.enable_fallback = False
-                LOG.debug('fhem-fallback enabled: %s' % self.enable_fallback)
+                cache_ttl = int(self.settings.get('cache_ttl', DEFAULT_TTL))
+            except (TypeError, ValueError):
+                cache_ttl = DEFAULT_TTL
+
+            # Check if natural language control is loaded at fhem-server
+            # and activate fallback accordingly
+            LOG.debug("fallback_device_name %s" %
+                      self.settings.get('fallback_device_name'))
+            LOG.debug("enable_fallback %s" %
+                      self.settings.get('enable_fallback'))
+            fallback_device_name = ""
+            if self.settings.get('enable_fallback'):
+                fallback_device_name = self.settings.get(
+                    'fallback_device_name', "")
+
+            # all devices that may be controlled, i.e. those in the
+            # configured FHEM room, with their complete readings.
+            # The fallback device is fetched along with them,
+            # so probing it costs no extra round trip
+            devspec = "room={}".format(connection.allowed_devices_room)
+            if fallback_device_name:
+                devspec += ",{}".format(fallback_device_name)
+            if daemon_client is not None:
+                # the devices come from the cache daemon shared with
+                # other Mycroft units, which is configured with the
+                # same devspec
+                device_sync = None
+                fetch = daemon_client.fetch
+                cache_ttl = CLIENT_TTL
+            else:
+                device_sync = DeltaSync(
+                    fhem.send_cmd, devspec,
+                    delta=self.settings.get('sync_mode', 'delta') != 'full',
+                    metrics=self.metrics, kept_readings=self._kept_readings())
+                fetch = device_sync.fetch
+            device_cache = DeviceCache(fetch, ttl=cache_ttl,
+                                       metrics=self.metrics)
+
+            try:
+                device_cache.refresh()
+                fallback_device = fallback_device_name and \
+                    device_cache.get(fallback_device_name)
+            except ConnectionError:
+                LOG.warning("can't load devices from FHEM")
+                fallback_device = None
+            fallback_device_type = None
+            if fallback_device:
+                fallback_device_type = fallback_device.type
+                LOG.debug("fallback_device_type is %s" %
+                          fallback_device_type)
+            enable_fallback = fallback_device_type in ["Talk2Fhem",
+                                                       "TEERKO",
+                                                       "Babble"]
+            LOG.debug('fhem-fallback enabled: %s' % enable_fallback)
+            connection = connection._replace(
+                device_cache=device_cache, device_sync=device_sync,
+                enable_fallback=enable_fallback,
+                fallback_device_name=fallback_device_name,
+                fallback_device_type=fallback_device_type)
+
+        if location is not None:
+            connection = connection._replace(
+                device_location=location.result())
+        LOG.debug("mycroft device location: {}".format(
+            connection.device_location))
+        # the first successful heartbeat after a failed setup is a
+        # recovery as well. With the cache daemon the daemon is asked,
+        # so the load on FHEM doesn't grow with the number of units
+        self._start_watchdog(
+            daemon_client.ping if daemon_client else fhem.ping,
+            healthy=connection.device_cache is not None)
+        return connection
+
+    def _start_watchdog(self, probe, healthy=None):
+        # keeps the connection warm and notices when the server is down
+        # (or back again) between intents
+        if self.watchdog:
+            self.watchdog.stop()
+            self.watchdog = None
+        try:
+            interval = float(self.settings.get('heartbeat_interval',
+                                               DEFAULT_HEARTBEAT))
+        except (TypeError, ValueError):
+            interval = DEFAULT_HEARTBEAT
+        if interval > 0:
+            self.watchdog = Watchdog(probe, interval,
+                                     on_recover=self._on_fhem_recovered,
+                                     healthy=healthy)
+            self.watchdog.start()
+
+    def _on_fhem_recovered(self):
+        LOG.info("FHEM server is back online")
+        if self.device_cache is None:
+            # the server was down during setup
+            self._setup(force=True)
+        else:
+            # devices may have changed while offline
+            self.device_cache.invalidate()
+
+    def _get_device_location(self):
+        # when description of home.mycroft.ai > Devices > [this mycroft device]
+        # is filled, use this the name of the room where mycroft is located
+        try:
+            info = DeviceApi().get()
+        except Exception as e:
+            LOG.warning("can't get device location: {}".format(e))
+            return self.device_location
+        return info.get('description', self.device_location)
 
     def initialize(self):
+        # before the setup, the device cache keeps the readings the
+        # notification rules test
+        self._setup_notifications()
         self._setup(True)
         # Needs higher priority than general fallback skills
         self.register_fallback(self.handle_fallback, 2)
@@ -118,23 +340,166 @@ class FhemSkill(FallbackSkill):
         self.register_entity_file('room.entity')
         self.register_entity_file('open.entity')
         self.register_entity_file('close.entity')
+        self.register_entity_file('aggregate.entity')
+        self.register_entity_file('reading.entity')
+        self.register_entity_file('period.entity')
+        self.register_entity_file('group.entity')
         #self.register_entity_file('blind.entity')
+        # replaces device and room entity by the names of the devices
+        try:
+            self._name_index()
+        except ConnectionError:
+            pass
+        self._setup_metrics()
+        self._setup_profiler()
+        self.add_event('fhem.profile.start', self.handle_profile_start)
+        self.add_event('fhem.profile.stop', self.handle_profile_stop)
 
     def on_websettings_changed(self):
         # Only attempt to load if the host is set
         LOG.debug("websettings changed")
+        self._setup_metrics()
+        self._setup_profiler()
+        self._setup_notifications()
         if self.settings.get('host', None):
             try:
                 self._setup(force=True)
             except Exception:
                 pass
 
-    #@intent_file_handler('blind.intent')
+    def _setup_metrics(self):
+        # Prometheus endpoint on localhost and/or periodic JSON dumps
+        # to the skill's data directory, both disabled with 0
+        try:
+            port = int(self.settings.get('metrics_port') or 0)
+            interval = int(self.settings.get('metrics_dump_interval') or 0)
+        except ValueError:
+            port = interval = 0
+        if self.metrics_server and self.metrics_server.port != port:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        if port and self.metrics_server is None:
+            try:
+                self.metrics_server = MetricsServer(self.metrics, port)
+                self.metrics_server.start()
+                LOG.info("metrics on http://127.0.0.1:%s/metrics" % port)
+            except (OSError, ValueError) as e:
+                LOG.error("can't start metrics server: {}".format(e))
+                self.metrics_server = None
+        if interval != self.metrics_dump_interval:
+            self.cancel_scheduled_event('MetricsDump')
+            if interval:
+                self.schedule_repeating_event(self._dump_metrics, None,
+                                              interval, name='MetricsDump')
+            self.metrics_dump_interval = interval
+
+    def _setup_notifications(self):
+        # announcements of FHEM events, the rules are in notifications.json
+        # in the skill's data directory
+        if self.event_queue is not None:
+            self.event_queue.close()
+            self.event_queue = None
+        self.notifier = None
+        if not self.settings.get('notifications') or \
+                not self.settings.get('host'):
+            return
+        try:
+            with self.file_system.open('notifications.json', 'r') as f:
+                rules = [Rule.from_dict(r) for r in json.load(f)]
+            quiet_hours = parse_quiet_hours(
+                self.settings.get('quiet_hours', ''))
+        except (OSError, ValueError, KeyError) as e:
+            LOG.error("can't load notification rules: {}".format(e))
+            return
+        self.notifier = Notifier(rules, self._peek_device, self.speak,
+                                 quiet_hours=quiet_hours)
+        try:
+            port = int(self.settings.get('event_port') or 7072)
+        except ValueError:
+            port = 7072
+        # FHEM's telnet port streams all events ("inform timer")
+        self.event_queue = python_fhem.FhemEventQueue(
+            self.settings.get('host'), self.events, port=port,
+            use_ssl=self.settings.get('ssl', False),
+            username=self.settings.get('username') or "",
+            password=self.settings.get('password') or "",
+            raw_value=True)
+        if self.events_thread is None:
+            self.events_thread = threading.Thread(target=self._handle_events,
+                                                  daemon=True)
+            self.events_thread.start()
+        LOG.info("%s notification rules" % len(rules))
+
+    def _kept_readings(self):
+        # those of the records plus the ones notification rules test
+        notifier = self.notifier
+        if notifier is None:
+            return KEPT_READINGS
+        return KEPT_READINGS + tuple(sorted(
+            notifier.readings.difference(KEPT_READINGS)))
+
+    def _peek_device(self, name):
+        # never waits for a reload, events keep coming meanwhile
+        device_cache = self.device_cache
+        return device_cache.peek(name) if device_cache else None
+
+    def _handle_events(self):
+        while True:
+            event = self.events.get()
+            notifier = self.notifier
+            if notifier is None:
+                continue
+            try:
+                # "while" conditions look at the cache, keep it current
+                device, reading, value = parse_event(event)
+                device_cache = self.device_cache
+                if device_cache is not None and \
+                        reading in self._kept_readings():
+                    device_cache.set_reading(device, reading, str(value))
+                notifier.handle(event)
+            except Exception:
+                LOG.exception("notification of {} failed".format(event))
+
+    def _setup_profiler(self):
+        # profile the next n intents/fallbacks when the setting changes
+        calls, sample_rate = parse_options(
+            self.settings.get('profile_calls'),
+            self.settings.get('profile_sample_rate')) or (0, 1.0)
+        if calls != self.profile_calls:
+            self.profile_calls = calls
+            self.profiler.start(calls, sample_rate)
+            LOG.info("profiling next %s calls (sample rate %s) to %s" %
+                     (calls, sample_rate, self.profiler.directory))
+
+    def handle_profile_start(self, message):
+        # messagebus: fhem.profile.start {"count": 10, "sample_rate": 0.1}
+        options = parse_options(message.data.get('count', 1),
+                                message.data.get('sample_rate'))
+        if options is None:
+            LOG.warning("invalid fhem.profile.start: %s" % message.data)
+            return
+        self.profiler.start(*options)
+        LOG.info("profiling next %s calls to %s" %
+                 (self.profiler.remaining, self.profiler.directory))
+
+    def handle_profile_stop(self, message):
+        self.profiler.stop()
+
+    def _dump_metrics(self, message=None):
+        with self.file_system.open('metrics.json', 'w') as f:
+            f.write(render_json(self.metrics))
+
+    @intent_file_handler('blind.intent')
+    @profiled
+    @pinned
     def handle_blind_intent(self, message):
         self._setup()
         if self.fhem is None:
             self.speak_dialog('fhem.error.setup')
             return
+        if not self.fhem.available():
+            self.speak_dialog('fhem.error.offline')
+            return
         LOG.info("Starting Blind Intent")
         LOG.info("message.data {}".format(message.data))
 
@@ -144,68 +509,148 @@ class FhemSkill(FallbackSkill):
         if message.data.get("open"):
             action = "open"
             speak_action = message.data.get("open")
-            target_pct = 0
         elif message.data.get("close"):
             action = "closed" # sic!
             speak_action = message.data.get("close")
-            target_pct = 100
         elif message.data.get("percent"):
             percent = message.data.get("percent")
             if percent.isdigit():
                 action = "pct"
-                target_pct = int(percent)
 
         if not action:
             LOG.info("no action for blind intent found!")
             return False
         if message.data.get("room"):
             room = message.data.get("room")
+            speak_room = room
         else:
             # if no room is given use device location
             room = self.device_location
+            speak_room = ""
         allowed_types = 'blind'
         LOG.info("Device: %s" % device)
         LOG.info("Action: %s" % action)
         LOG.info("Room: %s" % room)
         if percent:
             LOG.info("Percent: %s" % percent)
+
+        # "close all shades" or "set blinds in the bedroom to 50 percent"
+        # address every blind in the room instead of a single device
+        words = message.data.get("utterance", "").lower().split(" ")
+        group = device.lower() in self.translate_list("blind.group") or \
+            any(w in words for w in self.translate_list("all.words"))
         try:
-            fhem_device = self._find_device(device, allowed_types, room)
+            if group:
+                if room:
+                    room = self._normalize(self._clean_common_words(room))
+                if self.device_cache is None:
+                    raise ConnectionError("not connected to FHEM server")
+                fhem_devices = self.device_cache.filter(allowed_types, room)
+                if not fhem_devices:
+                    self.speak_dialog('fhem.device.unknown',
+                                      data={"dev_name": device})
+                    return
+                targets = [(d.name, d.dev_name)
+                           for d in fhem_devices]
+            else:
+                fhem_device = self._find_device(device, allowed_types, room)
+                if fhem_device is None:
+                    self.speak_dialog('fhem.device.unknown',
+                                      data={"dev_name": device})
+                    return
+                LOG.info("Entity State: %s" % fhem_device['state'])
+                targets = [(fhem_device['id'], fhem_device['dev_name'])]
         except ConnectionError:
             self.speak_dialog('fhem.error.offline')
             return
-        if fhem_device is None:
-            self.speak_dialog('fhem.device.unknown', data={"dev_name": device})
-            return
-        LOG.info("Entity State: %s" % fhem_device['state'])
 
-        open_pct = 0
-        closed_pct = 100
+        cmd = "pct {}".format(int(percent)) if action == "pct" else action
+        try:
+            moved, failed = self._move_blinds(targets, cmd)
+        except ConnectionError:
+            self.speak_dialog('fhem.error.offline')
+            return
+        LOG.info("moved: %s failed: %s" % (moved, failed))
+        self.device_context.remember([Handle(*t) for t in targets],
+                                     allowed_types, cmd, group)
 
-        blind = self.fhem.get_device(fhem_device['id'])[0]
-        if blind['Internals']['TYPE'] == 'ROLLO':
+        if not moved:
+            self.speak_dialog('fhem.error.notsupported')
+        elif failed:
+            self.speak_dialog('fhem.blind.partial',
+                              data={"count": len(moved),
+                                    "total": len(targets),
+                                    "failed": ", ".join(failed)})
+        elif not group:
             if action == "pct":
-                self.fhem.send_cmd("set {} pct {}".format(fhem_device['id'],
-                                                          target_pct))
                 self.speak_dialog('fhem.blind.set',
                                   data={"device": device,
-                                        "percent": target_pct})
+                                        "percent": int(percent)})
             else:
-                self.fhem.send_cmd("set {} {}".format(fhem_device['id'],
-                                                      action))
                 self.speak_dialog('fhem.blind', data={"device": device,
                                                       "action": speak_action,
-                                                      "room": room})
+                                                      "room": speak_room})
+        elif action == "pct":
+            self.speak_dialog('fhem.blind.group.set',
+                              data={"count": len(moved),
+                                    "room": speak_room,
+                                    "percent": int(percent)})
         else:
-            self.speak_dialog('fhem.error.notsupported')
-            return
+            self.speak_dialog('fhem.blind.group',
+                              data={"count": len(moved),
+                                    "action": speak_action,
+                                    "room": speak_room})
+
+    def _move_blinds(self, targets, cmd):
+        """Send cmd to all supported blinds in targets, a list of
+        (name, alias) tuples, in a single batched set command.
+
+        Returns the lists of aliases of the moved and the failed blinds.
+        """
+        supported = []
+        failed = []
+        for name, alias in targets:
+            dev = self.device_cache.get(name)
+            # the device type is taken from the cached Internals,
+            # so no extra request is needed per blind
+            if dev and dev.type == 'ROLLO':
+                supported.append((name, alias))
+            else:
+                failed.append(alias)
+        if not supported:
+            return [], failed
+
+        # FHEM accepts a comma separated devspec,
+        # so all blinds are moved by one command
+        devspec = ",".join(name for name, alias in supported)
+        response = self.fhem.send_cmd("set {} {}".format(devspec, cmd))
+        if isinstance(response, bytes):
+            response = response.decode('utf-8', 'replace')
+        response = (response or "").strip()
+        if not response:
+            return [alias for name, alias in supported], failed
+
+        # set returns nothing on success and an error message otherwise,
+        # which does not always name the device. A message without any
+        # known device name is taken as failure of all blinds.
+        LOG.warning("set {} {}: {}".format(devspec, cmd, response))
+        bad = [(name, alias) for name, alias in supported
+               if name in response] or supported
+        moved = [alias for name, alias in supported
+                 if (name, alias) not in bad]
+        return moved, failed + [alias for name, alias in bad]
 
     @intent_file_handler('switch.intent')
+    @profiled
+    @pinned
     def handle_switch_intent(self, message):
         self._setup()
         if self.fhem is None:
             self.speak_dialog('fhem.error.setup')
             return
+        if not self.fhem.available():
+            self.speak_dialog('fhem.error.offline')
+            return
         LOG.debug("Starting Switch Intent")
         LOG.debug("message.data {}".format(message.data))
 
@@ -249,222 +694,308 @@ class FhemSkill(FallbackSkill):
         if action in action_values.keys():
             action = action_values[action]
         LOG.debug("- action: %s" % action)
-        LOG.debug("- state: %s" % fhem_device['state']['Value'])
-        if fhem_device['state']['Value'] == action:
+        LOG.debug("- state: %s" % fhem_device['state'])
+        if fhem_device['state'] == action:
             LOG.debug("Entity in requested state")
             self.speak_dialog('fhem.device.already', data={
                 'dev_name': fhem_device['dev_name'],
                 'action': original_action})
-        elif action == 'toggle':
-            if(fhem_device['state']['Value'] == 'off'):
-                action = 'on'
-            else:
-                action = 'off'
-            LOG.debug("toggled action: %s" % action)
-            self.fhem.send_cmd("set {} {}".format(fhem_device['id'], action))
-            self.speak_dialog('fhem.switch',
-                              data={'dev_name': fhem_device['dev_name'],
-                                    'action': original_action})
-        elif action in ["on", "off"]:
-            LOG.debug("action: on/off")
+        elif action in ["toggle", "on", "off"]:
+            if action == 'toggle':
+                if(fhem_device['state'] == 'off'):
+                    action = 'on'
+                else:
+                    action = 'off'
+                LOG.debug("toggled action: %s" % action)
+            try:
+                self.fhem.send_cmd("set {} {}".format(fhem_device['id'],
+                                                      action))
+            except ConnectionError:
+                self.speak_dialog('fhem.error.offline')
+                return
+            self.device_cache.set_reading(fhem_device['id'], 'state', action)
             self.speak_dialog('fhem.switch',
                               data={'dev_name': fhem_device['dev_name'],
                                     'action': original_action})
-            self.fhem.send_cmd("set {} {}".format(fhem_device['id'], action))
         else:
             self.speak_dialog('fhem.error.sorry')
             return
+        self.device_context.remember(
+            [Handle(fhem_device['id'], fhem_device['dev_name'])],
+            allowed_types, action)
 
     @intent_handler(IntentBuilder("").optionally("LightsKeyword")
-                    .require("SetVerb").require("Device")
+                    .require("SetVerb").require("Device").optionally("Room")
                     .require("BrightnessValue").build())
+    @profiled
+    @pinned
     def handle_light_set_intent(self, message):
-        # TODO not supported yet
-        self.speak_dialog('fhem.error.notsupported')
-        return
-        #
         self._setup()
-        if(self.fhem is None):
+        if self.fhem is None:
             self.speak_dialog('fhem.error.setup')
             return
+        if not self.fhem.available():
+            self.speak_dialog('fhem.error.offline')
+            return
+        LOG.debug("Starting Light Set Intent")
+        LOG.debug("message.data {}".format(message.data))
+
         device = message.data["Device"]
-        allowed_types = ['light']  # TODO
-        try:
-            brightness_req = float(message.data["BrightnessValue"])
-            if brightness_req > 100 or brightness_req < 0:
-                self.speak_dialog('fhem.brightness.badreq')
-        except KeyError:
-            brightness_req = 10.0
-        brightness_value = int(brightness_req / 100 * 255)
-        brightness_percentage = int(brightness_req)
-        LOG.debug("device: %s" % device)
-        LOG.debug("Brightness Value: %s" % brightness_value)
-        LOG.debug("Brightness Percent: %s" % brightness_percentage)
         try:
-            fhem_device = self.fhem.find_device(device, allowed_types)
+            brightness = int(float(message.data["BrightnessValue"]))
+        except (KeyError, ValueError):
+            self.speak_dialog('fhem.brightness.badreq')
+            return
+        if brightness > 100 or brightness < 0:
+            self.speak_dialog('fhem.brightness.badreq')
+            return
+        # "set the lamp in the kitchen to 50 percent". Without a light
+        # word ("set the heating to 21") the only light in the device
+        # location must not be taken for whatever was said
+        room = message.data.get("Room", "")
+        if not room and message.data.get("LightsKeyword"):
+            room = self.device_location
+        allowed_types = 'light'
+        LOG.debug("Device: %s" % device)
+        LOG.debug("Brightness: %s" % brightness)
+        try:
+            fhem_device = self._find_device(device, allowed_types, room)
         except ConnectionError:
             self.speak_dialog('fhem.error.offline')
             return
         if fhem_device is None:
-            self.speak_dialog('fhem.device.unknown', data={
-                              "dev_name": device})
+            self.speak_dialog('fhem.device.unknown', data={"dev_name": device})
             return
-        fhem_data = {'device_id': fhem_device['id']}
-
-        # IDEA: set context for 'turn it off again' or similar
-        # self.set_context('Entity', fhem_entity['dev_name'])
 
-        # TODO - Allow value set
-        if "SetVerb" in message.data:
-            fhem_data['brightness'] = brightness_value
-            fhem_data['dev_name'] = fhem_device['dev_name']
-            self.fhem.execute_service("fhem", "turn_on", fhem_data)
-            self.speak_dialog('fhem.brightness.dimmed',
-                              data=fhem_data)
-        else:
-            self.speak_dialog('fhem.error.sorry')
+        cmd, level = dim_command(self.device_cache.get(fhem_device['id']))
+        if cmd is None:
+            self.speak_dialog('fhem.brightness.cantdim.dimmable',
+                              data={'dev_name': fhem_device['dev_name']})
+            return
+        try:
+            self._set_brightness(fhem_device['id'], cmd, brightness)
+        except ConnectionError:
+            self.speak_dialog('fhem.error.offline')
             return
+        self.device_context.remember(
+            [Handle(fhem_device['id'], fhem_device['dev_name'])],
+            allowed_types, "{} {}".format(cmd, brightness))
+        self.speak_dialog('fhem.brightness.dimmed',
+                          data={'dev_name': fhem_device['dev_name'],
+                                'brightness': brightness})
 
     @intent_handler(IntentBuilder("").optionally("LightsKeyword")
                     .one_of("IncreaseVerb", "DecreaseVerb",
                             "LightBrightenVerb", "LightDimVerb")
                     .require("Device").optionally("BrightnessValue").build())
+    @profiled
+    @pinned
     def handle_light_adjust_intent(self, message):
-        # TODO not supported yet
-        self.speak_dialog('fhem.error.notsupported')
-        return
-        #
         self._setup()
         if self.fhem is None:
             self.speak_dialog('fhem.error.setup')
             return
-        allowed_types = ['light']
-        device = message.data["Device"]
+        if not self.fhem.available():
+            self.speak_dialog('fhem.error.offline')
+            return
+        LOG.debug("Starting Light Adjust Intent")
+        LOG.debug("message.data {}".format(message.data))
 
+        device = message.data["Device"]
         try:
-            brightness_req = float(message.data["BrightnessValue"])
-            if brightness_req > 100 or brightness_req < 0:
-                self.speak_dialog('fhem.brightness.badreq')
-        except KeyError:
-            brightness_req = 10.0
-        brightness_value = int(brightness_req / 100 * 255)
-        # brightness_percentage = int(brightness_req) # debating use
-        LOG.debug("device: %s" % device)
-        LOG.debug("Brightness Value: %s" % brightness_value)
+            step = int(float(message.data["BrightnessValue"]))
+        except (KeyError, ValueError):
+            # no (or empty) value given
+            step = 10
+        if step > 100 or step < 0:
+            self.speak_dialog('fhem.brightness.badreq')
+            return
+        room = self.device_location
+        allowed_types = 'light'
+        LOG.debug("Device: %s" % device)
+        LOG.debug("Step: %s" % step)
         try:
-            fhem_device = self.fhem.find_device(device, allowed_types)
+            fhem_device = self._find_device(device, allowed_types, room)
         except ConnectionError:
             self.speak_dialog('fhem.error.offline')
             return
         if fhem_device is None:
-            self.speak_dialog('fhem.device.unknown', data={
-                              "dev_name": device})
+            self.speak_dialog('fhem.device.unknown', data={"dev_name": device})
             return
-        fhem_data = {'device_id': fhem_device['id']}
-        # IDEA: set context for 'turn it off again' or similar
-        # self.set_context('Entity', fhem_entity['dev_name'])
 
-        # if self.lang == 'de':
-        #    if action == 'runter' or action == 'dunkler':
-        #        action = 'dim'
-        #    elif action == 'heller' or action == 'hell':
-        #        action = 'brighten'
         if "DecreaseVerb" in message.data or \
                 "LightDimVerb" in message.data:
-            if fhem_device['state'] == "off":
-                self.speak_dialog('fhem.brightness.cantdim.off',
-                                  data=fhem_device)
-            else:
-                light_attrs = self.fhem.find_entity_attr(fhem_device['id'])
-                if light_attrs['unit_measure'] is None:
-                    self.speak_dialog(
-                        'fhem.brightness.cantdim.dimmable',
-                        data=fhem_device)
-                else:
-                    fhem_data['brightness'] = light_attrs['unit_measure']
-                    if fhem_data['brightness'] < brightness_value:
-                        fhem_data['brightness'] = 10
-                    else:
-                        fhem_data['brightness'] -= brightness_value
-                    self.fhem.execute_service("fhem", "turn_on", fhem_data)
-                    fhem_data['dev_name'] = fhem_device['dev_name']
-                    self.speak_dialog('fhem.brightness.decreased',
-                                      data=fhem_data)
+            increase = False
         elif "IncreaseVerb" in message.data or \
                 "LightBrightenVerb" in message.data:
-            if fhem_device['state'] == "off":
-                self.speak_dialog(
-                    'fhem.brightness.cantdim.off',
-                    data=fhem_device)
-            else:
-                light_attrs = self.fhem.find_entity_attr(fhem_device['id'])
-                if light_attrs['unit_measure'] is None:
-                    self.speak_dialog(
-                        'fhem.brightness.cantdim.dimmable',
-                        data=fhem_device)
-                else:
-                    fhem_data['brightness'] = light_attrs['unit_measure']
-                    if fhem_data['brightness'] > brightness_value:
-                        fhem_data['brightness'] = 255
-                    else:
-                        fhem_data['brightness'] += brightness_value
-                    self.fhem.execute_service("fhem", "turn_on", fhem_data)
-                    fhem_data['dev_name'] = fhem_device['dev_name']
-                    self.speak_dialog('fhem.brightness.increased',
-                                      data=fhem_data)
+            increase = True
         else:
             self.speak_dialog('fhem.error.sorry')
             return
 
+        dev_name = fhem_device['dev_name']
+        if fhem_device['state'] == "off":
+            self.speak_dialog('fhem.brightness.cantdim.off',
+                              data={'dev_name': dev_name})
+            return
+        # the current level comes from the device cache,
+        # so only the set command goes to the FHEM server
+        cmd, level = dim_command(self.device_cache.get(fhem_device['id']))
+        if cmd is None:
+            self.speak_dialog('fhem.brightness.cantdim.dimmable',
+                              data={'dev_name': dev_name})
+            return
+        if level is None:
+            # never dimmed before but switched on
+            level = 100
+        brightness = adjust_level(level, step, increase)
+        LOG.debug("%s: %s -> %s" % (cmd, level, brightness))
+        try:
+            self._set_brightness(fhem_device['id'], cmd, brightness)
+        except ConnectionError:
+            self.speak_dialog('fhem.error.offline')
+            return
+        self.device_context.remember(
+            [Handle(fhem_device['id'], fhem_device['dev_name'])],
+            allowed_types, "{} {}".format(cmd, brightness))
+        if increase:
+            self.speak_dialog('fhem.brightness.increased',
+                              data={'dev_name': dev_name,
+                                    'brightness': brightness})
+        else:
+            self.speak_dialog('fhem.brightness.decreased',
+                              data={'dev_name': dev_name,
+                                    'brightness': brightness})
+
+    def _set_brightness(self, device_id, cmd, brightness):
+        # brightness is percent, the command may have another range
+        value = dim_value(brightness,
+                          level_max(self.device_cache.get(device_id), cmd))
+        self.fhem.send_cmd("set {} {} {}".format(device_id, cmd, value))
+        self.device_cache.set_reading(device_id, cmd, str(value))
+        self.device_cache.set_reading(device_id, 'state',
+                                      'on' if brightness > 0 else 'off')
+
     @intent_handler(IntentBuilder("").require("AutomationActionKeyword")
-                    .require("Entity").build())
+                    .require("Device").build())
+    @profiled
+    @pinned
     def handle_automation_intent(self, message):
-        # TODO not supported yet
-        self.speak_dialog('fhem.error.notsupported')
-        return
-        #
         self._setup()
         if self.fhem is None:
             self.speak_dialog('fhem.error.setup')
             return
-        entity = message.data["Entity"]
-        allowed_types = ['automation', 'scene', 'script']  # TODO
-        LOG.debug("Entity: %s" % entity)
-        # also handle scene and script requests
+        if not self.fhem.available():
+            self.speak_dialog('fhem.error.offline')
+            return
+        LOG.debug("Starting Automation Intent")
+        LOG.debug("message.data {}".format(message.data))
+
+        device = message.data["Device"]
+        room = self.device_location
+        if room:
+            room = self._normalize(self._clean_common_words(room))
+        LOG.debug("Device: %s" % device)
+        LOG.debug("Room: %s" % room)
+        try:
+            scenes = self._scene_index()
+        except ConnectionError:
+            self.speak_dialog('fhem.error.offline')
+            return
+
+        scene = scenes.lookup(self._clean_common_words(device), room)
+        if scene is None and len(scenes) > 0:
+            # no exact match, fall back to fuzzy matching of the names
+            best = process.extractOne(self._normalize(device), scenes.names(),
+                                      scorer=fuzz.token_sort_ratio,
+                                      score_cutoff=50)
+            LOG.debug("fuzzy match: {}".format(best))
+            if best:
+                scene = scenes.lookup(best[0], room)
+        if scene is None:
+            self.speak_dialog('fhem.device.unknown', data={"dev_name": device})
+            return
+
+        LOG.debug("Triggered automation/scene: {}".format(scene))
         try:
-            fhem_entity = self.fhem.find_device(entity, allowed_types)
+            self.fhem.send_cmd(scene.cmd)
         except ConnectionError:
             self.speak_dialog('fhem.error.offline')
             return
-        fhem_data = {'entity_id': fhem_entity['id']}
-        if fhem_entity is None:
-            self.speak_dialog('fhem.device.unknown', data={
-                              "dev_name": entity})
-            return
-
-        # IDEA: set context for 'turn it off again' or similar
-        # self.set_context('Entity', fhem_entity['dev_name'])
-
-        LOG.debug("Triggered automation/scene/script: {}".format(fhem_data))
-        if "automation" in fhem_entity['id']:
-            self.fhem.execute_service('automation', 'trigger', fhem_data)
-            self.speak_dialog('fhem.automation.trigger',
-                              data={"dev_name": fhem_entity['dev_name']})
-        elif "script" in fhem_entity['id']:
-            self.speak_dialog('fhem.automation.trigger',
-                              data={"dev_name": fhem_entity['dev_name']})
-            self.fhem.execute_service("fhem", "turn_on", data=fhem_data)
-        elif "scene" in fhem_entity['id']:
-            self.speak_dialog('fhem.device.on',
-                              data=fhem_entity)
-            self.fhem.execute_service("fhem", "turn_on", data=fhem_data)
+        self.speak_dialog('fhem.automation.trigger',
+                          data={"dev_name": scene.dev_name})
+
+    def _scene_index(self):
+        # rebuilt from the device cache whenever it has been reloaded
+        device_cache = self.device_cache
+        if device_cache is None:
+            raise ConnectionError("not connected to FHEM server")
+        devices = device_cache.devices()
+        generation = device_cache.generation
+        cache, index_generation, index = self.scene_index
+        if cache is not device_cache or index_generation != generation:
+            index = SceneIndex(
+                devices,
+                lambda d: [self._normalize(r)
+                           for r in self._get_normalized_room_list(d)])
+            # a single assignment, concurrent intents see either the
+            # old or the new index
+            self.scene_index = (device_cache, generation, index)
+            LOG.debug("scene index: %s names" % len(index))
+        return index
+
+    def _name_index(self):
+        # rebuilt like the scene index, the entities are registered again
+        # when names or rooms changed
+        device_cache = self.device_cache
+        if device_cache is None:
+            raise ConnectionError("not connected to FHEM server")
+        devices = device_cache.devices()
+        generation = device_cache.generation
+        cache, index_generation, index = self.name_index
+        if cache is not device_cache or index_generation != generation:
+            index = NameIndex(
+                devices, self._normalize,
+                lambda d: [self._normalize(r)
+                           for r in self._get_normalized_room_list(d)])
+            self.name_index = (device_cache, generation, index)
+            self._register_entities(index)
+        return index
+
+    def _register_entities(self, index):
+        with self._entity_lock:
+            fingerprint = index.fingerprint()
+            if fingerprint == self.entity_fingerprint or self.bus is None:
+                return
+            directory = join(self.file_system.path, 'entities', self.lang)
+            # the static room words ("upstairs") stay
+            rooms = []
+            static = self.find_resource('room.entity', 'vocab')
+            if static:
+                with open(static, encoding='utf-8') as f:
+                    rooms = [line.strip() for line in f if line.strip()]
+            rooms += [r for r in index.rooms if r not in rooms]
+            for entity, lines in (('device', index.names), ('room', rooms)):
+                path = join(directory, entity + '.entity')
+                write_entity(path, lines)
+                self.bus.emit(Message('padatious:register_entity', {
+                    'file_name': path,
+                    'name': '{}:{}'.format(self.skill_id, entity)}))
+            self.entity_fingerprint = fingerprint
+            LOG.info("registered entities of %s device names and %s rooms" %
+                     (len(index.names), len(rooms)))
 
     @intent_file_handler('sensor.intent')
+    @profiled
+    @pinned
     def handle_sensor_intent(self, message):
         self._setup()
         if self.fhem is None:
             self.speak_dialog('fhem.error.setup')
             return
+        if not self.fhem.available():
+            self.speak_dialog('fhem.error.offline')
+            return
 
         device = message.data.get("device")
         if message.data.get("room"):
@@ -490,7 +1021,7 @@ class FhemSkill(FallbackSkill):
         sensor_unit = ""
 
         sensor_values = self.translate_namedvalues('sensor.value')
-        tokens = fhem_device['state']['Value'].split(" ")
+        tokens = fhem_device['state'].split(" ")
         for t in range(0, len(tokens)):
             tok = tokens[t].lower().replace(":", "")
             # LOG.debug("tok = %s" % tok)
@@ -504,8 +1035,7 @@ class FhemSkill(FallbackSkill):
                 sensor_state += tokens[t]
             sensor_state += " "
 
-        LOG.debug("fhem_device['state']['Value']: %s" %
-                  fhem_device['state']['Value'])
+        LOG.debug("fhem_device['state']: %s" % fhem_device['state'])
         LOG.debug("sensor_state: %s" % sensor_state)
         self.speak_dialog('fhem.sensor', data={
              "dev_name": sensor_name,
@@ -550,18 +1080,175 @@ class FhemSkill(FallbackSkill):
         # # if one wants to look up "outside temperature"
         # # self.set_context("SubjectOfInterest", sensor_unit)
 
+    @intent_file_handler('sensor.history.intent')
+    @profiled
+    @pinned
+    def handle_sensor_history_intent(self, message):
+        self._setup()
+        if self.fhem is None:
+            self.speak_dialog('fhem.error.setup')
+            return
+        if not self.fhem.available():
+            self.speak_dialog('fhem.error.offline')
+            return
+        if self.history is None:
+            self.speak_dialog('fhem.history.notconfigured')
+            return
+
+        spoken_aggregate = message.data.get("aggregate", "").lower()
+        spoken_reading = message.data.get("reading", "").lower()
+        spoken_period = message.data.get("period", "").lower()
+        aggregate = self.translate_namedvalues(
+            'history.aggregate.value').get(spoken_aggregate)
+        reading = self.translate_namedvalues(
+            'history.reading.value').get(spoken_reading)
+        if aggregate is None or reading is None:
+            self.speak_dialog('fhem.error.sorry')
+            return
+        period_name = self.translate_namedvalues(
+            'history.period.value').get(spoken_period, 'today')
+
+        # "in the greenhouse" names the room, the only sensor there
+        # is a perfect match
+        device = message.data.get("device") or spoken_reading
+        room = message.data.get("room") or self.device_location
+        try:
+            fhem_device = self._find_device(device, '(sensor|thermometer)',
+                                            room)
+        except ConnectionError:
+            self.speak_dialog('fhem.error.offline')
+            return
+        if fhem_device is None:
+            self.speak_dialog('fhem.device.unknown', data={
+                              "dev_name": device})
+            return
+
+        first, last = period(period_name, datetime.date.today())
+        try:
+            stats = self.history.stats(fhem_device['id'], reading,
+                                       first, last)
+        except (OSError, sqlite3.Error) as e:
+            LOG.error("can't read sensor history: {}".format(e))
+            stats = None
+        data = {"dev_name": fhem_device['dev_name'],
+                "aggregate": spoken_aggregate,
+                "reading": spoken_reading,
+                "period": spoken_period}
+        if stats is None:
+            self.speak_dialog('fhem.history.nodata', data=data)
+            return
+        data["value"] = round(getattr(stats, aggregate), 1)
+        self.speak_dialog('fhem.history', data=data)
+
+    @intent_file_handler('status.all.intent')
+    @profiled
+    @pinned
+    def handle_status_all_intent(self, message):
+        self._setup()
+        if self.fhem is None:
+            self.speak_dialog('fhem.error.setup')
+            return
+        if not self.fhem.available():
+            self.speak_dialog('fhem.error.offline')
+            return
+
+        # "all windows", "everything in the kitchen"
+        group = message.data.get("group", "").lower()
+        groups = self.translate_namedvalues('status.group.value')
+        if group and group not in groups:
+            self.speak_dialog('fhem.error.sorry')
+            return
+        # everything with a genericDeviceType, not scenes, DOIFs or the
+        # fallback device
+        allowed_types = groups.get(group, '.+')
+        room = message.data.get("room", "")
+        if room:
+            room = self._normalize(self._clean_common_words(room))
+        try:
+            if self.device_cache is None:
+                raise ConnectionError("not connected to FHEM server")
+            # all from the cached device list, not a request per device
+            devices = self.device_cache.filter(allowed_types, room)
+        except ConnectionError:
+            self.speak_dialog('fhem.error.offline')
+            return
+        if not devices:
+            self.speak_dialog('fhem.device.unknown',
+                              data={"dev_name": group or room})
+            return
+        if not group:
+            group = self.translate('status.everything')
+
+        readings, states = collect(devices)
+        reading_names = self.translate_namedvalues('sensor.value')
+        for r in ranges(readings):
+            reading = reading_names.get(r.reading, r.reading)
+            if r.count == 1:
+                self.speak_dialog('fhem.sensor', data={
+                    "dev_name": r.low_device.dev_name,
+                    "value": "{} {}".format(reading, round(r.low, 1)),
+                    "unit": ""})
+                continue
+            self.speak_dialog('fhem.status.range', data={
+                "reading": reading,
+                "low": round(r.low, 1),
+                "low_name": self._status_name(r.low_device, room),
+                "high": round(r.high, 1),
+                "high_name": self._status_name(r.high_device, room),
+                "mean": round(r.mean, 1)})
+        if not states:
+            return
+
+        state_names = self.translate_namedvalues('status.state.value')
+        found = majority(states)
+        if found is None:
+            counts = ["{} {}".format(len(recs), state_names.get(s, s))
+                      for s, recs in sorted(states.items(),
+                                            key=lambda i: -len(i[1]))]
+            self.speak_dialog('fhem.status.counts', data={
+                "group": group,
+                "counts": join_list(counts, self.translate('and'))})
+            return
+        state, exceptions = found
+        data = {"group": group, "state": state_names.get(state, state)}
+        if not exceptions:
+            self.speak_dialog('fhem.status.all', data=data)
+            return
+        names = []
+        for rec in exceptions:
+            name = self._status_name(rec, room)
+            if name not in names:
+                names.append(name)
+        data["exceptions"] = join_list(names, self.translate('and'))
+        self.speak_dialog('fhem.status.except', data=data)
+
+    def _status_name(self, record, room):
+        # "all windows are closed except bathroom": without a room in the
+        # question the room of a device tells which one is meant
+        rooms = self._get_normalized_room_list(record)
+        if not room and len(rooms) == 1:
+            return rooms[0]
+        return record.dev_name
+
     @intent_file_handler('presence.intent')
+    @profiled
+    @pinned
     def handle_presence_intent(self, message):
         self._setup()
         if self.fhem is None:
             self.speak_dialog('fhem.error.setup')
             return
+        if not self.fhem.available():
+            self.speak_dialog('fhem.error.offline')
+            return
         wanted = message.data["entity"]
         LOG.debug("wanted: %s" % wanted)
 
         try:
-            roommates = self.fhem.get(room=self.allowed_devices_room,
-                                      device_type='ROOMMATE')
+            if self.device_cache is None:
+                raise ConnectionError("not connected to FHEM server")
+            roommates = [d for d in self.device_cache.devices()
+                         if d.type == 'ROOMMATE']
         except ConnectionError:
             self.speak_dialog('fhem.error.offline')
             return
@@ -570,36 +1257,30 @@ class FhemSkill(FallbackSkill):
             self.speak_dialog('fhem.presence.error')
             return
 
-        presence = None
-        bestRatio = 66
-
-        for rm in roommates:
-            if 'rr_realname' in rm['Attributes'].keys():
-                realname = rm['Attributes'][rm['Attributes']['rr_realname']]
-                LOG.debug("realname: %s" % realname)
-                ratio = fuzz.ratio(wanted.lower(), realname.lower(),
-                                   score_cutoff=bestRatio)
-                LOG.debug("ratio: %s" % ratio)
-                if ratio > bestRatio:
-                    presence = rm['Readings']['presence']['Value']
-                    bestName = realname
-                    bestRatio = ratio
+        rm, ratio, _ = match_person(wanted, roommates)
+        LOG.debug("ratio: %s" % ratio)
+        presence = rm.readings.get('presence') if rm else None
 
         presence_values = self.translate_namedvalues('presence.value')
         if presence:
             location = presence_values[presence]
             self.speak_dialog('fhem.presence.found',
-                              data={'wanted': bestName,
+                              data={'wanted': rm.get('realname'),
                                     'location': location})
         else:
             self.speak_dialog('fhem.presence.error')
 
     @intent_file_handler('set.climate.intent')
+    @profiled
+    @pinned
     def handle_set_thermostat_intent(self, message):
         self._setup()
         if self.fhem is None:
             self.speak_dialog('fhem.error.setup')
             return
+        if not self.fhem.available():
+            self.speak_dialog('fhem.error.offline')
+            return
         LOG.debug("Starting Thermostat Intent")
 
         if message.data.get("device"):
@@ -639,40 +1320,42 @@ class FhemSkill(FallbackSkill):
 
         # check thermostat type, derive command and min/max values
         LOG.debug("fhem_device: %s" % fhem_device)
-        # for that get thermostat device
-        td = self.fhem.get_device(fhem_device['id'])
-        if len(td) != 1:
+        # the cached record has everything needed for that
+        try:
+            td = self.device_cache.get(device_id)
+        except ConnectionError:
+            self.speak_dialog('fhem.error.offline')
+            return
+        if td is None:
             self.speak_dialog('fhem.device.unknown', data={"dev_name": device})
             return
-        td = td[0]
         LOG.debug("td: %s" % td)
-        if 'desired-temp' in td['Readings']:
+        if 'desired-temp' in td.readings:
             cmd = "desired-temp"
-            if ('FBTYPE' in td['Readings']) and \
-               (td['Readings']['FBTYPE'] == 'Comet DECT'):
+            if td.readings.get('FBTYPE') == 'Comet DECT':
                 # LOG.debug("Comet DECT")
                 minValue = 8.0
                 maxValue = 28.0
-            elif td['Internals']['TYPE'] == 'FHT':
+            elif td.type == 'FHT':
                 # LOG.debug("FHT")
                 minValue = 6.0
                 maxValue = 30.0
-            elif td['Internals']['TYPE'] == 'CUL_HM':
+            elif td.type == 'CUL_HM':
                 LOG.debug("HM")
                 # test for Clima-Subdevice
-                if 'channel_04' in td['Internals']:
-                    target_device = td['Internals']['channel_04']
-        elif 'desiredTemperature' in td['Readings']:
+                if td.get('channel_04'):
+                    target_device = td.get('channel_04')
+        elif 'desiredTemperature' in td.readings:
             # LOG.debug("MAX")
             cmd = "desiredTemperature"
             minValue = 4.5
             maxValue = 30.5
-        elif 'desired' in td['Readings']:
+        elif 'desired' in td.readings:
             # LOG.debug("PID20")
             cmd = "desired"
-        elif 'homebridgeMapping' in td['Attributes']:
+        elif td.get('homebridgeMapping'):
             LOG.debug("homebridgeMapping")
-            hbm = td['Attributes']['homebridgeMapping'].split(" ")
+            hbm = td.get('homebridgeMapping').split(" ")
             for h in hbm:
                 # TargetTemperature=desired-temp::desired-temp,
                 # minValue=5,maxValue=35,minStep=0.5,nocache=1
@@ -713,23 +1396,165 @@ class FhemSkill(FallbackSkill):
 
         action = "%s %s" % (cmd, temperature)
         LOG.debug("set %s %s" % (target_device, action))
-        self.fhem.send_cmd("set {} {}".format(target_device, action))
+        try:
+            self.fhem.send_cmd("set {} {}".format(target_device, action))
+        except ConnectionError:
+            self.speak_dialog('fhem.error.offline')
+            return
         self.speak_dialog('fhem.set.thermostat',
                           data={
                               "dev_name": device,
                               "value": temperature,
                               "unit": unit})
 
+    @intent_file_handler('followup.intent')
+    @profiled
+    @pinned
+    def handle_followup_intent(self, message):
+        # "turn it off again": switch the devices of the last intent
+        self._setup()
+        if self.fhem is None:
+            self.speak_dialog('fhem.error.setup')
+            return
+        if not self.fhem.available():
+            self.speak_dialog('fhem.error.offline')
+            return
+        LOG.debug("Starting Followup Intent")
+        LOG.debug("message.data {}".format(message.data))
+
+        context = self.device_context.recall()
+        if context is None:
+            self.speak_dialog('fhem.context.unknown')
+            return
+        if context.allowed_types not in ['(light|switch|outlet)', 'light']:
+            self.speak_dialog('fhem.error.notsupported')
+            return
+        action = message.data.get("action")
+        original_action = action
+        action_values = self.translate_namedvalues('actions.value')
+        if action in action_values.keys():
+            action = action_values[action]
+        try:
+            if self.device_cache is None:
+                raise ConnectionError("not connected to FHEM server")
+            if action == 'toggle':
+                dev = self.device_cache.get(context.handles[0].id)
+                if dev and dev.state == 'off':
+                    action = 'on'
+                else:
+                    action = 'off'
+            if action not in ["on", "off"]:
+                self.speak_dialog('fhem.error.sorry')
+                return
+
+            devspec = ",".join(h.id for h in context.handles)
+            self.fhem.send_cmd("set {} {}".format(devspec, action))
+        except ConnectionError:
+            self.speak_dialog('fhem.error.offline')
+            return
+        self._record_followup(len(context.handles))
+        for h in context.handles:
+            self.device_cache.set_reading(h.id, 'state', action)
+        self.device_context.remember(context.handles, context.allowed_types,
+                                     action, context.group)
+        self.speak_dialog('fhem.switch',
+                          data={'dev_name': ", ".join(h.dev_name for h in
+                                                      context.handles),
+                                'action': original_action})
+
+    @intent_file_handler('followup.room.intent')
+    @profiled
+    @pinned
+    def handle_followup_room_intent(self, message):
+        # "and the one in the bedroom": repeat the last command for the
+        # same kind of device in another room
+        self._setup()
+        if self.fhem is None:
+            self.speak_dialog('fhem.error.setup')
+            return
+        if not self.fhem.available():
+            self.speak_dialog('fhem.error.offline')
+            return
+        LOG.debug("Starting Followup Room Intent")
+        LOG.debug("message.data {}".format(message.data))
+
+        context = self.device_context.recall()
+        if context is None:
+            self.speak_dialog('fhem.context.unknown')
+            return
+        room = self._normalize(self._clean_common_words(
+            message.data.get("room", "")))
+        try:
+            if self.device_cache is None:
+                raise ConnectionError("not connected to FHEM server")
+            # no fuzzy matching here: the device type is known already,
+            # the room has to match exactly
+            handles = room_targets(context, self.device_cache, room)
+            if not handles:
+                self.speak_dialog('fhem.device.unknown',
+                                  data={"dev_name": room})
+                return
+
+            devspec = ",".join(h.id for h in handles)
+            self.fhem.send_cmd("set {} {}".format(devspec, context.cmd))
+        except ConnectionError:
+            self.speak_dialog('fhem.error.offline')
+            return
+        self._record_followup(len(handles))
+        if context.cmd in ["on", "off"]:
+            for h in handles:
+                self.device_cache.set_reading(h.id, 'state', context.cmd)
+        self.device_context.remember(handles, context.allowed_types,
+                                     context.cmd, context.group)
+        self.speak_dialog('fhem.context.done',
+                          data={'dev_name': ", ".join(h.dev_name
+                                                      for h in handles)})
+
+    def _record_followup(self, count):
+        # a follow-up skips resolving the devices again,
+        # book the average resolution time as saved
+        find_device = self.metrics.histogram('fhem_find_device_seconds')
+        self.metrics.counter(
+            'fhem_followup_total',
+            'Intents served from the conversational context').inc()
+        self.metrics.counter(
+            'fhem_followup_saved_seconds_total',
+            'Device resolution time saved by follow-up intents').inc(
+                count * find_device.mean())
+
+    @profiled
+    @pinned
     def handle_fallback(self, message):
+        with self.metrics.histogram(
+                'fhem_fallback_seconds',
+                'Time spent passing utterances to FHEM').time():
+            handled = self._handle_fallback(message)
+        self.metrics.counter(
+            'fhem_fallback_total', 'Utterances passed to the fallback',
+            labelnames=('outcome',)).labels(
+                outcome=self.fallback_outcome or
+                ('handled' if handled else 'unhandled')).inc()
+        return handled
+
+    def _handle_fallback(self, message):
         LOG.debug("entering handle_fallback with utterance '%s'" %
                   message.data.get('utterance'))
+        # reason why the fallback was not even tried (for the metrics)
+        self.fallback_outcome = None
         self._setup()
         if self.fhem is None:
             LOG.debug("FHEM setup error")
+            self.fallback_outcome = 'setup_error'
             self.speak_dialog('fhem.error.setup')
             return False
         if not self.enable_fallback:
             LOG.debug("fallback not enabled!")
+            self.fallback_outcome = 'disabled'
+            return False
+        if not self.fhem.available():
+            # don't hold up the other fallbacks while FHEM is down
+            LOG.debug("FHEM server offline")
+            self.fallback_outcome = 'offline'
             return False
 
         # pass message to FHEM-server
@@ -761,11 +1586,18 @@ class FhemSkill(FallbackSkill):
                 return False
         except ConnectionError:
             LOG.debug("connection error")
+            self.fallback_outcome = 'offline'
             self.speak_dialog('fhem.error.offline')
             return False
 
         fdn = self.fallback_device_name
-        result = self.fhem.get_readings(name=fdn)
+        try:
+            result = self.fhem.get_readings(name=fdn)
+        except ConnectionError:
+            LOG.debug("connection error")
+            self.fallback_outcome = 'offline'
+            self.speak_dialog('fhem.error.offline')
+            return False
         LOG.debug("result: %s" % result)
 
         if not result:
@@ -804,110 +1636,29 @@ class FhemSkill(FallbackSkill):
         return True
 
     def _find_device(self, device, allowed_types, room=""):
+        with self.metrics.histogram(
+                'fhem_find_device_seconds',
+                'Time spent resolving a spoken device name').time():
+            return self._match_device(device, allowed_types, room)
+
+    def _match_device(self, device, allowed_types, room):
         LOG.debug("device: {} allowed_types: {} room: {}".format(device,
                                                                  allowed_types,
                                                                  room))
-        filter_dict = {'genericDeviceType': allowed_types}
-
-        # new search strategy: first check if there is a fit in specified room
-        if room:
-            room = self._normalize(self._clean_common_words(room))
-            # LOG.debug("normalized room: {}".format(room))
-            filter_dict['room'] = room
-        device_candidates = self.fhem.get(room=self.allowed_devices_room,
-                                          filters=filter_dict)
-
-        if len(device_candidates) == 1:
-            # TODO can we do anything if len(...) > 1 ?
-            LOG.debug("perfect match")
-            # we have a perfect match:
-            # there is only one device of the allowed type in the room
-            dc = device_candidates[0]
-            best_device = {"id": dc['Name'],
-                           "dev_name": self._get_aliasname(dc),
-                           "state": dc['Readings']['state'],
-                           "best_score": 999}
-            return best_device
-
-        # try again without filter on room
-        if 'room' in filter_dict.keys():
-            LOG.debug("try again without filter on room")
-            del filter_dict['room']
-        device_candidates = self.fhem.get(room=self.allowed_devices_room,
-                                          filters=filter_dict)
-        # LOG.debug(device_candidates)
-
-        # require a score above 50%
-        best_score = 50
-        best_device = None
-
-        if device_candidates:
-            for dc in device_candidates:
-                # LOG.debug("==================================================")
-                norm_name = self._normalize(dc['Name'])
-                norm_name_list = norm_name.split(" ")
-                # LOG.debug("norm_name_list = %s" % norm_name_list)
-
-                dev_room = self._get_normalized_room_list(dc)
-                for r in dev_room:
-                    if (r not in norm_name_list):
-                        norm_name += (" " + self._normalize(r))
-
-                # LOG.debug("dev_room: {}".format(dev_room))
-                # LOG.debug("norm_name = %s" % norm_name)
-
-                alias = self._get_aliasname(dc)
-                norm_alias = self._normalize(alias)
-
-                try:
-                    if (norm_name != norm_alias) and ('alias' in
-                                                      dc['Attributes']):
-                        score = fuzz.token_sort_ratio(
-                            device,
-                            norm_alias)
-                        # add bonus if room name match
-                        if room and dev_room:
-                            score += self._get_bonus_for_room(room,
-                                                              dev_room[0])
-                        if score > best_score:
-                            best_score = score
-                            best_device = {
-                                "id": dc['Name'],
-                                "dev_name": alias,
-                                "state": dc['Readings']['state'],
-                                "best_score": best_score}
-
-                    score = fuzz.token_sort_ratio(device, norm_name)
-                    # add bonus if room name match
-                    if room and dev_room:
-                        score += self._get_bonus_for_room(room, dev_room[0])
-                    # LOG.debug("%s %s" % (norm_name, score))
-                    if score > best_score:
-                        best_score = score
-                        best_device = {
-                            "id": dc['Name'],
-                            "dev_name": alias,
-                            "state": dc['Readings']['state'],
-                            "best_score": best_score}
-
-                except KeyError:
-                    pass  # print("KeyError")
-            LOG.debug("best device = %s" % best_device)
-            return best_device
-
-    def _get_bonus_for_room(self, room, dev_room):
-        if fuzz.ratio(room, dev_room) > REQUIRED_RATIO_FOR_BONUS:
-            LOG.debug("bonus! {} {}".format(room, dev_room))
-            return BONUS
-        else:
-            return 0
-
-    def _get_aliasname(self, device):
-        if 'alias' in device['Attributes']:
-            alias = device['Attributes']['alias']
-        else:
-            alias = device['Name']
-        return alias
+        if self.device_cache is None:
+            raise ConnectionError("not connected to FHEM server")
+
+        dc, score, how = match_device(
+            device, allowed_types, room, self.device_cache,
+            self._get_normalized_room_list, self._name_index(),
+            self.translate_list("common.words"))
+        LOG.debug("{} match: {} ({})".format(how, dc and dc.name, score))
+        if dc is None:
+            return None
+        return {"id": dc.name,
+                "dev_name": dc.dev_name,
+                "state": dc.state,
+                "best_score": score}
 
     def _get_normalized_room_list(self, dev):
         # add device room to name
@@ -915,9 +1666,11 @@ class FhemSkill(FallbackSkill):
         # LOG.debug(self.ignore_rooms)
         ignore = [x.lower() for x in self.ignore_rooms.split(",")]
         # LOG.debug("ignore = %s" % ignore)
-        if 'room' in dev['Attributes']:
-            rooms = [x.lower() for x in dev['Attributes']['room'].split(",")]
-            rooms.remove(self.allowed_devices_room.lower())
+        if dev.rooms:
+            rooms = [x.lower() for x in dev.rooms]
+            # the fallback device is cached as well but may be elsewhere
+            if self.allowed_devices_room.lower() in rooms:
+                rooms.remove(self.allowed_devices_room.lower())
             # LOG.debug("rooms = %s" % rooms)
             for r in rooms:
                 # LOG.debug("r = %s" % r)
@@ -927,29 +1680,20 @@ class FhemSkill(FallbackSkill):
         return dev_room
 
     def _normalize(self, name):
-        s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', name)
-        s2 = re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
-        return s2.replace("_", " ").replace("-", " ").replace(".", " ")
+        return normalize(name)
 
     def _clean_common_words(self, text):
-        txt = text.split(" ")
-        common_words = self.translate_list("common.words")
-        # LOG.debug("common_words {}".format(common_words))
-        for i in range(0, len(txt)):
-            if txt[i] in common_words:
-                txt[i] = ""
-        res = ""
-        for t in txt:
-            res += "{} ".format(t)
-        prev_len = len(res) + 1
-        while prev_len > len(res):
-            res.replace("  ", " ")
-            prev_len = len(res)
-        # LOG.debug("out {}".format(res))
-        return res.strip()
+        return remove_words(text, self.translate_list("common.words"))
 
     def shutdown(self):
         self.remove_fallback(self.handle_fallback)
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.watchdog:
+            self.watchdog.stop()
+        if self.event_queue is not None:
+            self.event_queue.close()
+        self.notifier = None
         super(FhemSkill, self).shutdown()
 
     def stop(self):
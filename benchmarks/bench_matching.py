@@ -0,0 +1,208 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Top-1 accuracy and latency of the device matching on a labelled corpus.
+
+    python -m benchmarks.bench_matching [--lang en-us] [--repeat 20]
+                                        [--sweep] [--misses]
+
+benchmarks/corpus/<lang> holds the devices (devices.json, jsonlist2) and
+the utterances (utterances.json, a list in the format of test/intent
+with the name of the device that is meant as "expected_device", null if
+none of the devices is meant). The slots are resolved the way the
+handlers do it: the room rule, exact names and fuzzy matching for
+devices, the realname of ROOMMATEs for presence. A query is correct if
+the expected device or no device for null is found.
+
+With --sweep the thresholds of fhemskill.matching.Scoring are varied
+over a grid and the settings with the best accuracy are printed; ties
+are broken in favour of the settings closest to the current ones.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+from fhemskill.cache import DeviceCache
+from fhemskill.entities import NameIndex
+from fhemskill.matching import SCORING, match_device, match_person
+from fhemskill.names import normalize
+from fhemskill.records import project
+
+SKILL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DIR = os.path.join(SKILL_DIR, 'benchmarks', 'corpus')
+LANGUAGES = ['en-us', 'de-de']
+
+# the room of the devices FHEM exposes to the skill (allowed_devices_room)
+ALLOWED_ROOM = 'homebridge'
+
+# intent_type: (slot with the device, genericDeviceTypes the handler
+# accepts), None for the realname of a ROOMMATE
+INTENTS = {
+    'switch.intent': ('device', '(light|switch|outlet)'),
+    'handle_light_set_intent': ('Device', 'light'),
+    'handle_light_adjust_intent': ('Device', 'light'),
+    'blind.intent': ('device', 'blind'),
+    'set.climate.intent': ('device', 'thermostat'),
+    'sensor.intent': ('device', '(sensor|thermometer)'),
+    'presence.intent': ('entity', None),
+}
+
+GRID = {
+    'required_ratio_for_bonus': [70, 80, 85, 89, 95],
+    'bonus': [0, 10, 15, 25, 35],
+    'min_score': [40, 45, 50, 55, 60, 70],
+    'presence_ratio': [50, 60, 66, 70, 75, 80],
+}
+
+
+def rooms_of(dev):
+    return [r.lower() for r in dev.rooms if r.lower() != ALLOWED_ROOM]
+
+
+class Corpus(object):
+    """The devices and labelled utterances of one language."""
+
+    def __init__(self, lang):
+        path = os.path.join(CORPUS_DIR, lang)
+        with open(os.path.join(path, 'devices.json'),
+                  encoding='utf-8') as f:
+            records = [project(raw) for raw in json.load(f)]
+        with open(os.path.join(path, 'utterances.json'),
+                  encoding='utf-8') as f:
+            self.utterances = json.load(f)
+        with open(os.path.join(SKILL_DIR, 'dialog', lang,
+                               'common.words.list'),
+                  encoding='utf-8') as f:
+            self.common_words = [w.strip() for w in f if w.strip()]
+        self.lang = lang
+        self.cache = DeviceCache(lambda: records)
+        self.roommates = [d for d in records if d.type == 'ROOMMATE']
+        self.name_index = NameIndex(records, normalize, rooms_of)
+
+    def match(self, fixture, scoring=SCORING):
+        """The name of the device the utterance is resolved to, or
+        None."""
+        slot, allowed_types = INTENTS[fixture['intent_type']]
+        data = fixture['intent']
+        if allowed_types is None:
+            record = match_person(data[slot], self.roommates, scoring)[0]
+        else:
+            record = match_device(data[slot], allowed_types,
+                                  data.get('room', ''), self.cache,
+                                  rooms_of, self.name_index,
+                                  self.common_words, scoring)[0]
+        return record.name if record else None
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def evaluate(corpus, scoring=SCORING, repeat=1):
+    """Return the misses as (fixture, found) and the fastest time of
+    each query in seconds."""
+    misses = []
+    times = []
+    for fixture in corpus.utterances:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            found = corpus.match(fixture, scoring)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        times.append(best)
+        if found != fixture['expected_device']:
+            misses.append((fixture, found))
+    return misses, times
+
+
+def report(corpus, repeat, show_misses):
+    misses, times = evaluate(corpus, repeat=repeat)
+    total = len(corpus.utterances)
+    micros = [t * 1e6 for t in times]
+    print("{}: top-1 {}/{} = {:.1%}  latency us  p50: {:.0f}  p90: {:.0f}"
+          "  max: {:.0f}".format(corpus.lang, total - len(misses), total,
+                                 (total - len(misses)) / total,
+                                 percentile(micros, 50),
+                                 percentile(micros, 90), max(micros)))
+    if show_misses:
+        for fixture, found in misses:
+            print("  MISS {!r}: found {} expected {}".format(
+                fixture['utterance'], found, fixture['expected_device']))
+    return len(misses)
+
+
+def distance(scoring):
+    # relative change from the current settings
+    return sum(abs(a - b) / float(b or 1) for a, b in zip(scoring, SCORING))
+
+
+def sweep(corpora, top=5):
+    """Print the accuracy of the current and the best grid settings.
+
+    The presence ratio is independent of the device thresholds and is
+    swept on its own."""
+    fields = ['required_ratio_for_bonus', 'bonus', 'min_score']
+    total = sum(len(c.utterances) for c in corpora)
+
+    def correct(scoring):
+        return total - sum(len(evaluate(c, scoring)[0]) for c in corpora)
+
+    results = []
+    for values in itertools.product(*(GRID[f] for f in fields)):
+        scoring = SCORING._replace(**dict(zip(fields, values)))
+        results.append((correct(scoring), scoring))
+    best_devices = max(results,
+                       key=lambda r: (r[0], -distance(r[1])))[1]
+    presence = []
+    for ratio in GRID['presence_ratio']:
+        scoring = best_devices._replace(presence_ratio=ratio)
+        presence.append((correct(scoring), scoring))
+    best = max(presence, key=lambda r: (r[0], -distance(r[1])))
+
+    print("current:   {}/{}  {}".format(correct(SCORING), total, SCORING))
+    results.sort(key=lambda r: (-r[0], distance(r[1])))
+    for hits, scoring in results[:top]:
+        print("grid:      {}/{}  {}".format(hits, total, scoring))
+    print("suggested: {}/{}  {}".format(best[0], total, best[1]))
+    return best[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--lang', action='append', choices=LANGUAGES,
+                        help='default: all')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='runs of each query, the fastest is reported')
+    parser.add_argument('--sweep', action='store_true',
+                        help='search the grid for better thresholds')
+    parser.add_argument('--misses', action='store_true',
+                        help='list the utterances matched wrongly')
+    args = parser.parse_args(argv)
+
+    corpora = [Corpus(lang) for lang in args.lang or LANGUAGES]
+    misses = sum(report(c, args.repeat, args.misses) for c in corpora)
+    if args.sweep:
+        sweep(corpora)
+    return 1 if misses else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Events per second the Notifier handles with many rules, compared with
+checking every rule for every event."""
+
+import random
+import time
+
+from fhemskill.notify import Notifier, Rule
+from fhemskill.records import project
+
+from .fhemdata import devices
+
+DEVICES = 2000
+RULES = 5000
+EVENTS = 100000
+
+
+def make_rules(records, rnd):
+    rules = []
+    for i in range(RULES):
+        dev = rnd.choice(records)
+        # mostly rules for single devices, some for a type or room
+        kind = {8: 1, 9: 2}.get(i % 10, 0)
+        if kind == 0:
+            rules.append(Rule("{dev_name} changed", device=dev.name,
+                              value=str(rnd.randint(0, 100))))
+        elif kind == 1:
+            rules.append(Rule("{dev_name} high", type=dev.generic_type,
+                              reading='humidity', above=rnd.randint(50, 99)))
+        else:
+            rules.append(Rule("{dev_name} cold", room=dev.rooms[-1],
+                              reading='temperature',
+                              below=rnd.randint(0, 20)))
+    return rules
+
+
+class Linear(Notifier):
+    """Every rule is a candidate for every event."""
+
+    def _candidates(self, device, record, rooms, reading):
+        return [r for r in self._all if r.reading == reading]
+
+
+def event(device, reading, value):
+    # as reported by FhemEventQueue(raw_value=True)
+    if reading == 'state':
+        return {'device': device, 'reading': 'STATE', 'value': value}
+    return {'device': device, 'reading': reading,
+            'value': '{}: {}'.format(reading, value)}
+
+
+def run(notifier, events):
+    start = time.perf_counter()
+    for event in events:
+        notifier.handle(event)
+    return len(events) / (time.perf_counter() - start)
+
+
+def main():
+    rnd = random.Random(1)
+    records = dict((r.name, r) for r in map(project, devices(DEVICES)))
+    names = list(records)
+    rules = make_rules(list(records.values()), rnd)
+    events = [event(rnd.choice(names),
+                    rnd.choice(['state', 'humidity', 'temperature']),
+                    str(rnd.randint(0, 100))) for _ in range(EVENTS)]
+
+    indexed = Notifier(rules, records.get, lambda text: None)
+    linear = Linear(rules, records.get, lambda text: None)
+    linear._all = rules
+    print("{} devices, {} rules".format(DEVICES, RULES))
+    print("indexed: {:10.0f} events/s".format(run(indexed, events)))
+    print("linear:  {:10.0f} events/s".format(
+        run(linear, events[:EVENTS // 50])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Parsing a jsonlist2 response of 5000 devices into DeviceRecords: the
+previous json.loads() of the whole document against the streaming parser.
+
+Peak is the highest Python heap usage during the parse as reported by
+tracemalloc, not counting the response text itself."""
+
+import gc
+import json
+import time
+import tracemalloc
+
+from fhemskill.records import project
+from fhemskill.sync import iter_results
+
+from .fhemdata import jsonlist2_response
+
+COUNT = 5000
+ROUNDS = 3
+
+
+def full_load(text):
+    return [project(dev) for dev in json.loads(text)['Results']]
+
+
+def streaming(text):
+    return [project(dev) for dev in iter_results(text)]
+
+
+def first_match(parse, text):
+    """Seconds until the first record is available."""
+    start = time.perf_counter()
+    if parse is streaming:
+        next(project(dev) for dev in iter_results(text))
+    else:
+        full_load(text)[0]
+    return time.perf_counter() - start
+
+
+def peak(parse, text):
+    gc.collect()
+    tracemalloc.start()
+    parse(text)
+    peak_size = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak_size
+
+
+def throughput(parse, text):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        parse(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return COUNT / best
+
+
+def main():
+    text = jsonlist2_response(COUNT)
+    print("devices: {}  response: {:.1f} MiB".format(
+        COUNT, len(text) / 1024.0 / 1024))
+    print("{:12} {:>12} {:>16} {:>14}".format(
+        "", "peak MiB", "devices/s", "first ms"))
+    for parse in (full_load, streaming):
+        print("{:12} {:12.1f} {:16.0f} {:14.1f}".format(
+            parse.__name__, peak(parse, text) / 1024.0 / 1024,
+            throughput(parse, text), first_match(parse, text) * 1000))
+
+
+if __name__ == '__main__':
+    main()
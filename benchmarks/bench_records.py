@@ -0,0 +1,63 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Memory used by raw jsonlist2 dicts and by DeviceRecords per 1000
+devices, measured with tracemalloc."""
+
+import gc
+import json
+import tracemalloc
+
+from fhemskill.records import project
+
+from .fhemdata import jsonlist2_response
+
+COUNT = 1000
+
+
+def measure(build):
+    """Return (bytes allocated by build() and still alive, result)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def main():
+    text = jsonlist2_response(COUNT)
+
+    raw_size, raw = measure(lambda: json.loads(text)['Results'])
+    del raw
+    # what stays alive after the raw dicts are dropped, this includes
+    # the strings the records share with them
+    record_size, records = measure(
+        lambda: [project(d) for d in json.loads(text)['Results']])
+
+    per_1k = 1000.0 / COUNT
+    print("devices:            {}".format(COUNT))
+    print("raw dicts:          {:8.0f} KiB per 1k devices".format(
+        raw_size * per_1k / 1024))
+    print("DeviceRecords:      {:8.0f} KiB per 1k devices".format(
+        record_size * per_1k / 1024))
+    print("ratio:              {:8.1f}x".format(
+        raw_size / float(record_size)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Synthetic jsonlist2 data shaped like a real FHEM installation."""
+
+import json
+import random
+
+_TYPES = [
+    # (TYPE, genericDeviceType, readings, PossibleSets)
+    ('HUEDevice', 'light',
+     ['state', 'pct', 'bri', 'ct', 'hue', 'sat', 'onoff', 'reachable',
+      'colormode', 'lastseen'],
+     'on off toggle pct:slider,0,1,100 bri:slider,0,1,254 ct:colorpicker'),
+    ('CUL_HM', 'switch',
+     ['state', 'CommandAccepted', 'R-sign', 'deviceMsg', 'level',
+      'pct', 'recentStateType', 'trigLast', 'trigDst_self01'],
+     'on off toggle on-for-timer statusRequest'),
+    ('ROLLO', 'blind',
+     ['state', 'position', 'desired_position', 'last_drive', 'drive_type'],
+     'open closed half stop position:0,10,20,30,40,50,60,70,80,90,100'),
+    ('CUL_HM', 'thermostat',
+     ['state', 'desired-temp', 'measured-temp', 'humidity', 'ValvePosition',
+      'batteryLevel', 'controlMode', 'motorErr', 'boostTime'],
+     'desired-temp:slider,4.5,0.5,30.5 controlMode:auto,manual,boost'),
+    ('LaCrosse', 'thermometer',
+     ['state', 'temperature', 'humidity', 'battery', 'dewpoint'],
+     ''),
+]
+
+_ROOMS = ['Living Room', 'Kitchen', 'Bedroom', 'Bathroom', 'Office',
+          'Hall', 'Garden', 'Garage', 'Greenhouse', 'Basement']
+
+
+def device(i, rnd):
+    """Return the jsonlist2 dict of the i-th synthetic device."""
+    dev_type, generic, readings, sets = rnd.choice(_TYPES)
+    name = '{}_{}_{:04d}'.format(dev_type, generic, i)
+    room = rnd.choice(_ROOMS)
+    time = '2019-05-{:02d} {:02d}:{:02d}:{:02d}'.format(
+        rnd.randint(1, 28), rnd.randint(0, 23), rnd.randint(0, 59),
+        rnd.randint(0, 59))
+    return {
+        'Name': name,
+        'PossibleSets': sets,
+        'PossibleAttrs': 'alias comment:textField-long eventMap group '
+                         'icon room userReadings:textField-long '
+                         'verbose:0,1,2,3,4,5 genericDeviceType',
+        'Internals': {
+            'DEF': '{:06X}'.format(i), 'FUUID': '5cd0-{:08x}'.format(i),
+            'NAME': name, 'NR': str(100 + i), 'STATE': 'on',
+            'TYPE': dev_type, 'IODev': 'HMLAN1',
+            'LASTInputDev': 'HMLAN1', 'MSGCNT': str(rnd.randint(1, 9999)),
+        },
+        'Readings': dict(
+            (r, {'Value': str(rnd.randint(0, 100)), 'Time': time})
+            for r in readings),
+        'Attributes': {
+            'alias': '{} {}'.format(room, generic).title(),
+            'room': 'Homebridge,{}'.format(room),
+            'genericDeviceType': generic, 'group': generic.title(),
+            'icon': 'hue_filled_{}'.format(generic),
+            'userReadings': 'energy {ReadingsVal($name,"power",0)/1000}',
+            'verbose': '3',
+        },
+    }
+
+
+def devices(count, seed=1):
+    """Return count synthetic jsonlist2 device dicts."""
+    rnd = random.Random(seed)
+    return [device(i, rnd) for i in range(count)]
+
+
+def jsonlist2_response(count, seed=1):
+    """Return the (indented, like FHEM sends it) jsonlist2 text of
+    count synthetic devices."""
+    return json.dumps({'Arg': 'room=Homebridge',
+                       'Results': devices(count, seed),
+                       'totalResultsReturned': count}, indent=2)
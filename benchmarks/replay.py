@@ -0,0 +1,228 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Replays intent fixtures against the skill from many threads at once.
+
+    python -m benchmarks.replay [--threads 16] [--rounds 50] [--swap]
+                                [fixture.intent.json ...]
+
+The fixtures use the format of test/intent (utterance, intent_type,
+intent data, expected_dialog), by default those in benchmarks/intents.
+The skill talks to an in-process fake FHEM server holding the devices of
+benchmarks/intents/devices.json. All threads start together and each
+call is checked for exceptions and the expected dialog; throughput and
+latency percentiles are printed at the end. With --swap the settings are
+changed continuously during the replay, like on_websettings_changed does
+when the user edits them on home.mycroft.ai, which exposes handlers
+that mix state of two connections.
+
+This needs a Mycroft environment (mycroft-core, python_fhem, rapidfuzz)
+and is run from the skill directory.
+"""
+
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+SKILL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(SKILL_DIR, 'benchmarks', 'intents')
+
+
+class FakeFhem(object):
+    """Stands in for python_fhem.Fhem, answers jsonlist2 from the
+    recorded devices and accepts every set command."""
+
+    devices = []
+    latency = 0.002
+
+    def __init__(self, *args, **kwargs):
+        self._connected = False
+
+    def connect(self):
+        self._connected = True
+
+    def connected(self):
+        return self._connected
+
+    def send_cmd(self, msg, timeout=None):
+        time.sleep(self.latency)
+        if msg.startswith('jsonlist2'):
+            return json.dumps({'Arg': msg[len('jsonlist2 '):],
+                               'Results': self.devices}).encode('utf-8')
+        # the delta query is not understood, i.e. full syncs only
+        return b''
+
+    def get_readings(self, *args, **kwargs):
+        return {}
+
+
+def load_skill():
+    """Import the skill directory as a package and return a FhemSkill
+    talking to FakeFhem."""
+    spec = importlib.util.spec_from_file_location(
+        'fhem_skill', os.path.join(SKILL_DIR, '__init__.py'),
+        submodule_search_locations=[SKILL_DIR])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    module.python_fhem.Fhem = FakeFhem
+    skill = module.create_skill()
+    skill.settings.update({'host': 'fake', 'portnum': 8083,
+                           'heartbeat_interval': 0, 'sync_mode': 'full'})
+    return skill
+
+
+def handlers(skill):
+    """Map the .intent file names to the handler methods."""
+    result = {}
+    for name in dir(type(skill)):
+        method = getattr(type(skill), name)
+        for intent_file in getattr(method, 'intent_files', []):
+            result[intent_file] = getattr(skill, name)
+    return result
+
+
+def capture_dialogs(skill):
+    """Replace speak_dialog, return a function giving (and resetting) the
+    dialogs spoken by the calling thread."""
+    local = threading.local()
+
+    def speak_dialog(key, data=None, expect_response=False, wait=False):
+        local.__dict__.setdefault('spoken', []).append(key)
+    skill.speak_dialog = speak_dialog
+
+    def spoken():
+        result = local.__dict__.get('spoken', [])
+        local.spoken = []
+        return result
+    return spoken
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def load_fixtures(paths=None, devices=None):
+    """Read the fixtures (default: all of benchmarks/intents) and give
+    FakeFhem the recorded devices."""
+    paths = paths or sorted(
+        glob.glob(os.path.join(FIXTURE_DIR, '*.intent.json')))
+    fixtures = []
+    for path in paths:
+        with open(path) as f:
+            fixtures.append(json.load(f))
+    with open(devices or os.path.join(FIXTURE_DIR, 'devices.json')) as f:
+        FakeFhem.devices = json.load(f)
+    return fixtures
+
+
+def replay(skill, fixtures, threads, rounds, swap=False):
+    # imported here, so FakeFhem and the fixtures can be used without
+    # a Mycroft environment
+    from mycroft.messagebus.message import Message
+
+    handler_of = handlers(skill)
+    spoken = capture_dialogs(skill)
+    barrier = threading.Barrier(threads)
+    results = []
+    lock = threading.Lock()
+
+    def worker(offset):
+        barrier.wait()
+        for i in range(rounds):
+            fixture = fixtures[(offset + i) % len(fixtures)]
+            message = Message(fixture['intent_type'],
+                              dict(fixture['intent'],
+                                   utterance=fixture['utterance']))
+            error = None
+            start = time.perf_counter()
+            try:
+                handler_of[fixture['intent_type']](message)
+            except Exception:
+                error = traceback.format_exc()
+            elapsed = time.perf_counter() - start
+            dialogs = spoken()
+            with lock:
+                results.append((fixture, elapsed, dialogs, error))
+
+    done = threading.Event()
+
+    def swapper():
+        # what changing the settings on home.mycroft.ai does
+        while not done.is_set():
+            skill.on_websettings_changed()
+
+    start = time.perf_counter()
+    if swap:
+        swap_thread = threading.Thread(target=swapper, daemon=True)
+        swap_thread.start()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, range(threads)))
+    done.set()
+    return results, time.perf_counter() - start
+
+
+def report(results, elapsed):
+    failures = 0
+    for fixture, _, dialogs, error in results:
+        if error or dialogs != [fixture['expected_dialog']]:
+            failures += 1
+            if failures <= 10:
+                print("FAIL {!r}: spoke {} expected {}".format(
+                    fixture['utterance'], dialogs,
+                    fixture['expected_dialog']))
+                if error:
+                    print(error)
+    latencies = [r[1] * 1000 for r in results]
+    print("calls: {}  failures: {}  throughput: {:.0f}/s".format(
+        len(results), failures, len(results) / elapsed))
+    print("latency ms  p50: {:.1f}  p90: {:.1f}  p99: {:.1f}  "
+          "max: {:.1f}".format(percentile(latencies, 50),
+                               percentile(latencies, 90),
+                               percentile(latencies, 99), max(latencies)))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('fixtures', nargs='*')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=50,
+                        help='calls per thread')
+    parser.add_argument('--swap', action='store_true',
+                        help='change the settings during the replay')
+    parser.add_argument('--devices',
+                        default=os.path.join(FIXTURE_DIR, 'devices.json'))
+    args = parser.parse_args(argv)
+
+    fixtures = load_fixtures(args.fixtures, args.devices)
+
+    skill = load_skill()
+    skill._setup(force=True)
+    results, elapsed = replay(skill, fixtures, args.threads, args.rounds,
+                              args.swap)
+    return 1 if report(results, elapsed) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
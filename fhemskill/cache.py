@@ -0,0 +1,126 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import threading
+import time
+
+# seconds after which the device list is fetched again from FHEM
+DEFAULT_TTL = 60
+
+
+class DeviceCache(object):
+    """Local copy of the DeviceRecords of the controllable devices.
+
+    Intent handlers resolve devices and read their current readings from
+    here, so a request only needs a round trip to FHEM for the actual
+    ``set`` command. The list is fetched again once it is older than
+    ``ttl`` seconds; readings changed by the skill itself are patched in
+    place so they are correct before the next fetch.
+
+    The cache is shared by concurrent intents: lookups take no lock, a
+    reload builds a new dict and swaps it in, and a patched reading
+    replaces the readings dict of the record instead of changing it.
+    """
+
+    def __init__(self, fetch, ttl=DEFAULT_TTL, clock=time.monotonic,
+                 metrics=None):
+        # fetch() returns a list of DeviceRecords
+        self._fetch = fetch
+        self.ttl = ttl
+        self._clock = clock
+        self._devices = {}
+        self._loaded = None
+        self._lock = threading.RLock()
+        # incremented on every reload, lets users rebuild derived indexes
+        self.generation = 0
+        self._lookups = None
+        self._refreshes = None
+        if metrics is not None:
+            self._lookups = metrics.counter(
+                'fhem_cache_lookups_total',
+                'Device cache lookups by result (hit or reload)',
+                labelnames=('result',))
+            self._refreshes = metrics.histogram(
+                'fhem_cache_refresh_seconds',
+                'Duration of device list reloads')
+
+    def __len__(self):
+        return len(self._devices)
+
+    def stale(self):
+        return self._loaded is None or \
+            self._clock() - self._loaded > self.ttl
+
+    def refresh(self):
+        start = self._clock()
+        with self._lock:
+            devices = self._fetch() or []
+            self._devices = dict((d.name, d) for d in devices)
+            self._loaded = self._clock()
+            self.generation += 1
+        if self._refreshes is not None:
+            self._refreshes.observe(self._clock() - start)
+
+    def invalidate(self):
+        self._loaded = None
+
+    def _current(self):
+        stale = self.stale()
+        if stale:
+            with self._lock:
+                # only the first of concurrent lookups reloads
+                if self.stale():
+                    self.refresh()
+        if self._lookups is not None:
+            self._lookups.labels(result='reload' if stale else 'hit').inc()
+        return self._devices
+
+    def devices(self):
+        return list(self._current().values())
+
+    def get(self, name):
+        return self._current().get(name)
+
+    def peek(self, name):
+        """Like get() but never reloads, for callers that must not
+        wait for FHEM (e.g. per event)."""
+        return self._devices.get(name)
+
+    def filter(self, allowed_types, room=""):
+        """Return devices whose genericDeviceType matches the regular
+        expression allowed_types and that are located in room (if given).
+
+        Matching follows the FILTER devspec of FHEM: the type has to match
+        as a whole, the room is compared with each entry of the room list.
+        """
+        type_re = re.compile(allowed_types, re.IGNORECASE)
+        room = room.lower()
+        result = []
+        for dev in self.devices():
+            if not type_re.fullmatch(dev.generic_type):
+                continue
+            if room and room not in [r.lower() for r in dev.rooms]:
+                continue
+            result.append(dev)
+        return result
+
+    def set_reading(self, name, reading, value):
+        """Record a reading value the skill has just set on FHEM."""
+        dev = self._devices.get(name)
+        if dev is not None:
+            readings = dict(dev.readings)
+            readings[reading] = value
+            dev.readings = readings
@@ -0,0 +1,103 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+# cheap command to check that the server responds
+PING_CMD = 'list global TYPE'
+
+
+class FhemClient(object):
+    """Wrapper of a python_fhem.Fhem object that records count, outcome
+    and duration of the requests in a MetricsRegistry.
+
+    With a CircuitBreaker requests fail fast with ConnectionError while
+    the server is known to be down. timeout (seconds) is passed to every
+    send_cmd that does not set its own.
+
+    Everything that is not wrapped is passed on to the Fhem object.
+    """
+
+    def __init__(self, fhem, metrics, breaker=None, timeout=None):
+        self._fhem = fhem
+        self.breaker = breaker
+        self.timeout = timeout
+        self._requests = metrics.counter(
+            'fhem_requests_total', 'Requests sent to the FHEM server',
+            labelnames=('method', 'outcome'))
+        self._duration = metrics.histogram(
+            'fhem_request_seconds', 'Duration of requests to FHEM',
+            labelnames=('method',))
+        self._connects = metrics.counter(
+            'fhem_connects_total', 'Connection attempts to the FHEM server')
+
+    def __getattr__(self, name):
+        return getattr(self._fhem, name)
+
+    def available(self):
+        """False while the circuit breaker rejects requests."""
+        return self.breaker is None or self.breaker.available()
+
+    def _call(self, method, *args, **kwargs):
+        if self.breaker is not None and not self.breaker.allow():
+            self._requests.labels(method=method, outcome='rejected').inc()
+            raise ConnectionError("FHEM server is offline")
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = getattr(self._fhem, method)(*args, **kwargs)
+            # python_fhem logs failed requests and drops the connection
+            # instead of raising
+            if self._fhem.connected():
+                outcome = 'ok' if result or method == 'send_cmd' \
+                    else 'empty'
+            return result
+        finally:
+            self._duration.labels(method=method).observe(
+                time.perf_counter() - start)
+            self._requests.labels(method=method, outcome=outcome).inc()
+            if self.breaker is not None:
+                if outcome == 'error':
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+
+    def connect(self):
+        self._connects.inc()
+        return self._fhem.connect()
+
+    def send_cmd(self, msg, **kwargs):
+        if self.timeout and 'timeout' not in kwargs:
+            kwargs['timeout'] = self.timeout
+        return self._call('send_cmd', msg, **kwargs)
+
+    def get(self, *args, **kwargs):
+        return self._call('get', *args, **kwargs)
+
+    def get_readings(self, *args, **kwargs):
+        return self._call('get_readings', *args, **kwargs)
+
+    def ping(self):
+        """Send a cheap command, return True if the server answered."""
+        if not self.available():
+            # wait for the breaker to allow the next probe
+            return False
+        if not self._fhem.connected():
+            self.connect()
+        try:
+            self.send_cmd(PING_CMD)
+        except ConnectionError:
+            return False
+        return self._fhem.connected()
@@ -0,0 +1,77 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import time
+from collections import namedtuple
+
+# seconds a follow-up like "turn it off again" refers to the last devices
+DEFAULT_EXPIRY = 120
+
+# a device resolved by an intent
+Handle = namedtuple('Handle', ['id', 'dev_name'])
+
+# what the last intent did: the devices, the genericDeviceType regular
+# expression they were searched with and the set command sent to them
+Context = namedtuple('Context', ['handles', 'allowed_types', 'cmd', 'group',
+                                 'created'])
+
+
+class DeviceContext(object):
+    """Devices addressed by the last intent, kept for a short time so
+    follow-up commands can use them without resolving them again."""
+
+    def __init__(self, expiry=DEFAULT_EXPIRY, clock=time.monotonic):
+        self.expiry = expiry
+        self._clock = clock
+        self._context = None
+
+    def remember(self, handles, allowed_types, cmd, group=False):
+        # a single assignment, so readers never see a partial context
+        self._context = Context(tuple(handles), allowed_types, cmd, group,
+                                self._clock())
+
+    def recall(self):
+        """Return the last Context or None when there is none or it has
+        expired."""
+        context = self._context
+        if context is None or \
+                self._clock() - context.created > self.expiry:
+            return None
+        return context
+
+    def clear(self):
+        self._context = None
+
+
+def room_targets(context, cache, room):
+    """Return Handles of the devices in room meant by a follow-up like
+    "and the one in the bedroom": those of the genericDeviceTypes of the
+    remembered devices, all of them for a group command ("close all
+    blinds"), otherwise only if there is just one. Returns [] if there
+    is no such device."""
+    types = set()
+    for h in context.handles:
+        dev = cache.get(h.id)
+        if dev is not None and dev.generic_type:
+            types.add(dev.generic_type)
+    allowed_types = context.allowed_types
+    if types:
+        allowed_types = "({})".format(
+            "|".join(re.escape(t) for t in sorted(types)))
+    candidates = cache.filter(allowed_types, room)
+    if len(candidates) > 1 and not context.group:
+        return []
+    return [Handle(d.name, d.dev_name) for d in candidates]
@@ -0,0 +1,286 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Device cache shared by several Mycroft units.
+
+Every unit running the skill would otherwise poll FHEM on its own. The
+daemon keeps one DeviceCache, optionally kept current by FHEM's event
+stream, and serves it on a Unix socket (units on the same host) or a
+local TCP port; the skill fetches its device list from there instead of
+from FHEM. Run it with
+
+    python -m fhemskill.daemon --host fhem.local --listen /tmp/fhem.sock
+
+and set the "cache_daemon" setting of the skill to the same address.
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+
+from .cache import DeviceCache
+from .events import parse_event
+from .records import KEPT_READINGS, dump, load
+
+LOG = logging.getLogger(__name__)
+
+# seconds between syncs of the daemon with FHEM
+DEFAULT_POLL = 10
+# seconds the skill keeps the list fetched from the daemon,
+# asking it is cheap
+CLIENT_TTL = 2
+
+
+def parse_address(address):
+    """Return the socket family and address of "/path/to/socket",
+    "host:port" or "port"."""
+    if '/' in address:
+        return socket.AF_UNIX, address
+    host, _, port = address.rpartition(':')
+    return socket.AF_INET, (host or '127.0.0.1', int(port))
+
+
+class CacheServer(object):
+    """Serves the devices of cache, one JSON request and response per
+    line:
+
+        {"cmd": "ping"}
+        -> {"ok": true}
+        {"cmd": "devices", "version": "3.17"}
+        -> {"version": "3.17", "unchanged": true}
+        -> {"version": "4.17", "devices": [[...], ...]}
+
+    The version changes when a sync changed devices or an event updated
+    a reading, so units only transfer the list after changes.
+    """
+
+    def __init__(self, cache, address):
+        self.cache = cache
+        self.family, self.address = parse_address(address)
+        self._devices = []
+        self._changes = 0
+        self._events = 0
+        self._lock = threading.RLock()
+        self._server = None
+
+    def version(self):
+        with self._lock:
+            devices = self.cache.devices()
+            # the cache is reloaded on every poll, but DeltaSync returns
+            # the same records unless devices were changed
+            if len(devices) != len(self._devices) or \
+                    any(a is not b for a, b in zip(devices, self._devices)):
+                self._devices = devices
+                self._changes += 1
+            return "{}.{}".format(self._changes, self._events)
+
+    def apply_event(self, event):
+        """Update the cache from an event dict of python_fhem's
+        FhemEventQueue."""
+        device, reading, value = parse_event(event)
+        if reading not in KEPT_READINGS:
+            return
+        with self._lock:
+            if self.cache.get(device) is None:
+                return
+            self.cache.set_reading(device, reading, str(value))
+            self._events += 1
+
+    def handle(self, request):
+        if request.get('cmd') == 'ping':
+            return {'ok': True}
+        if request.get('cmd') != 'devices':
+            return {'error': 'unknown command'}
+        try:
+            with self._lock:
+                version = self.version()
+                devices = self._devices
+        except ConnectionError as e:
+            return {'error': str(e)}
+        if request.get('version') == version:
+            return {'version': version, 'unchanged': True}
+        return {'version': version, 'devices': [dump(d) for d in devices]}
+
+    def start(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        response = server.handle(json.loads(line.decode()))
+                    except ValueError:
+                        response = {'error': 'invalid request'}
+                    self.wfile.write(json.dumps(response).encode() + b'\n')
+
+        if self.family == socket.AF_UNIX:
+            if os.path.exists(self.address):
+                # left over by a previous run
+                os.unlink(self.address)
+            base = socketserver.ThreadingUnixStreamServer
+        else:
+            base = socketserver.ThreadingTCPServer
+
+        class Server(base):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self._server = Server(self.address, Handler)
+        # port 0 lets the system choose a free port
+        self.address = self._server.server_address
+        thread = threading.Thread(target=self._server.serve_forever,
+                                  daemon=True)
+        thread.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            if self.family == socket.AF_UNIX:
+                os.unlink(self.address)
+            self._server = None
+
+
+class DaemonClient(object):
+    """Fetches the device list from a CacheServer; fetch() is meant to be
+    the fetch function of the skill's DeviceCache."""
+
+    def __init__(self, address, timeout=5):
+        self.family, self.address = parse_address(address)
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+        self._version = None
+        self._devices = []
+        # the watchdog pings from its own thread
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._sock = socket.socket(self.family, socket.SOCK_STREAM)
+        self._sock.settimeout(self.timeout)
+        self._sock.connect(self.address)
+        self._file = self._sock.makefile('rb')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = self._file = None
+
+    def _request(self, request):
+        with self._lock:
+            return self._send(json.dumps(request).encode() + b'\n')
+
+    def _send(self, data):
+        # the daemon may have been restarted since the last request,
+        # so a broken connection is retried once
+        for retry in (True, False):
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall(data)
+                line = self._file.readline()
+                if not line:
+                    raise OSError("connection closed by cache daemon")
+                return json.loads(line.decode())
+            except ValueError as e:
+                # e.g. a reply cut off by a timeout
+                self.close()
+                raise ConnectionError(
+                    "invalid reply of cache daemon: {}".format(e))
+            except OSError as e:
+                self.close()
+                if not retry:
+                    raise ConnectionError(
+                        "cache daemon {} not reachable: {}".format(
+                            self.address, e))
+
+    def ping(self):
+        """Return True if the daemon answers."""
+        try:
+            return self._request({'cmd': 'ping'}).get('ok', False)
+        except ConnectionError:
+            return False
+
+    def fetch(self):
+        response = self._request({'cmd': 'devices',
+                                  'version': self._version})
+        if 'error' in response:
+            raise ConnectionError("cache daemon: {}".format(
+                response['error']))
+        if not response.get('unchanged'):
+            self._devices = [load(d) for d in response['devices']]
+            self._version = response['version']
+        return self._devices
+
+
+def main(argv=None):
+    import queue
+    import fhem as python_fhem
+    from .sync import DeltaSync
+
+    parser = argparse.ArgumentParser(
+        description="Device cache shared by the FHEM skills of several "
+                    "Mycroft units")
+    parser.add_argument('--host', required=True, help="FHEM server")
+    parser.add_argument('--port', type=int, default=8083)
+    parser.add_argument('--protocol', default='http')
+    parser.add_argument('--ssl', action='store_true')
+    parser.add_argument('--username')
+    parser.add_argument('--password')
+    parser.add_argument('--room', default='Homebridge',
+                        help="FHEM room of the controllable devices")
+    parser.add_argument('--fallback-device', default='',
+                        help="Talk2Fhem, TEERKO or Babble device")
+    parser.add_argument('--listen', default='/tmp/fhem-skill-cache.sock',
+                        help="socket path, or [host:]port for TCP (on "
+                             "127.0.0.1 without host); the device list is "
+                             "served to anyone who can connect")
+    parser.add_argument('--poll', type=int, default=DEFAULT_POLL,
+                        help="seconds between syncs with FHEM")
+    parser.add_argument('--telnet-port', type=int, default=7072,
+                        help="port of FHEM's event stream, 0 to only poll")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    fhem = python_fhem.Fhem(args.host, port=args.port, csrf=True,
+                            protocol=args.protocol, use_ssl=args.ssl,
+                            username=args.username, password=args.password)
+    devspec = "room={}".format(args.room)
+    if args.fallback_device:
+        devspec += ",{}".format(args.fallback_device)
+    sync = DeltaSync(fhem.send_cmd, devspec)
+    server = CacheServer(DeviceCache(sync.fetch, ttl=args.poll),
+                         args.listen)
+    server.start()
+    LOG.info("serving devices of %s on %s" % (devspec, server.address))
+
+    if args.telnet_port:
+        events = queue.Queue()
+        python_fhem.FhemEventQueue(args.host, events, port=args.telnet_port,
+                                   raw_value=True)
+        while True:
+            server.apply_event(events.get())
+    else:
+        threading.Event().wait()
+
+
+if __name__ == '__main__':
+    main()
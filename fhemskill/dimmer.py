@@ -0,0 +1,76 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+
+# readings (and set commands of the same name) used by FHEM dimmers,
+# in order of preference
+DIM_READINGS = ['pct', 'dim', 'brightness']
+
+# pct and dim are percent, brightness goes up to 255 on most modules
+# unless the slider in PossibleSets says otherwise
+DEFAULT_MAX = {'brightness': 255}
+
+_number = re.compile(r'-?\d+(\.\d+)?')
+
+
+def parse_level(value, maximum=100):
+    """Extract the brightness level in percent from a reading value like
+    '50', '50 %' or 'dim50%' that goes up to maximum. Returns None if
+    there is no number."""
+    m = _number.search(str(value))
+    if m is None:
+        return None
+    return clamp(float(m.group(0)) * 100 / maximum)
+
+
+def clamp(level):
+    return int(round(min(100, max(0, level))))
+
+
+def level_max(device, cmd):
+    """The value of the reading or set command cmd of a DeviceRecord
+    that means 100 percent."""
+    return device.get(cmd + '_max', DEFAULT_MAX.get(cmd, 100))
+
+
+def dim_value(level, maximum=100):
+    """The value to set for level percent."""
+    return int(round(clamp(level) * maximum / 100.0))
+
+
+def dim_command(device):
+    """Return (command, current level in percent) for a DeviceRecord.
+
+    The command is the first dim reading the device has. A device that
+    was never dimmed may lack the reading but still offer the command in
+    its PossibleSets, then the level is None.
+    Returns (None, None) for devices that can not be dimmed.
+    """
+    for reading in DIM_READINGS:
+        if reading in device.readings:
+            return reading, parse_level(device.readings[reading],
+                                        level_max(device, reading))
+    for reading in DIM_READINGS:
+        if reading in device.sets:
+            return reading, None
+    return None, None
+
+
+def adjust_level(current, step, increase):
+    """Return the new level after changing current by step percent."""
+    if increase:
+        return clamp(current + step)
+    return clamp(current - step)
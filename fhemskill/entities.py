@@ -0,0 +1,88 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Exact name lookups and Padatious entity files from the device list.
+
+The {device} and {room} slots of the intents are trained with the names
+that actually exist, and a slot value that is exactly such a name is
+resolved with a dict lookup instead of fuzzy matching.
+"""
+
+import hashlib
+import os
+
+
+def _spaces(text):
+    # normalize() keeps the blanks of "Ceiling Light" next to the ones
+    # it inserts
+    return " ".join(text.split())
+
+
+class NameIndex(object):
+    """Devices by normalized name and alias.
+
+    normalize(text) gives the spoken form of a name, rooms_of(dev) the
+    (normalized) rooms of a DeviceRecord. Only devices with a
+    genericDeviceType are indexed, the others can't be addressed by the
+    intents that look up names.
+    """
+
+    def __init__(self, devices, normalize, rooms_of):
+        self._by_name = {}
+        rooms = set()
+        for dev in devices:
+            if not dev.generic_type:
+                continue
+            dev_rooms = [_spaces(r) for r in rooms_of(dev)]
+            rooms.update(dev_rooms)
+            for key in {_spaces(normalize(dev.name)),
+                        _spaces(normalize(dev.dev_name))}:
+                self._by_name.setdefault(key, []).append((dev, dev_rooms))
+        self.names = sorted(self._by_name)
+        self.rooms = sorted(rooms)
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def fingerprint(self):
+        """Changes when the names or rooms change."""
+        h = hashlib.sha1()
+        for name in self.names + [''] + self.rooms:
+            h.update(name.encode('utf-8') + b'\n')
+        return h.hexdigest()
+
+    def lookup(self, name, type_re, room=""):
+        """Return the only device called name (normalized, single
+        blanks) whose genericDeviceType matches the compiled regular
+        expression type_re, preferring those in room; None if there is
+        none or it is ambiguous."""
+        candidates = [(dev, rooms) for dev, rooms in
+                      self._by_name.get(name, ())
+                      if type_re.fullmatch(dev.generic_type)]
+        if room and len(candidates) > 1:
+            candidates = [c for c in candidates if room in c[1]]
+        if len(candidates) == 1:
+            return candidates[0][0]
+        return None
+
+
+def write_entity(path, lines):
+    """Write an entity file, one name per line."""
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(line + '\n')
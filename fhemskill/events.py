@@ -0,0 +1,39 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The events of python_fhem's FhemEventQueue.
+
+With raw_value=True an event line "2019-05-01 12:00:00 CUL_HM washer
+power: 2.5 W" arrives as
+
+    {'device': 'washer', 'reading': 'power', 'value': 'power: 2.5 W', ...}
+
+and a change of the state ("... front_door open") as
+
+    {'device': 'front_door', 'reading': 'STATE', 'value': 'open', ...}
+"""
+
+
+def parse_event(event):
+    """Return device, reading and value of an event dict, with the
+    reading as in jsonlist2 ('state' instead of 'STATE') and the value
+    without the "<reading>: " prefix."""
+    reading = event.get('reading') or 'STATE'
+    value = event.get('value')
+    if reading == 'STATE':
+        reading = 'state'
+    elif isinstance(value, str) and value.startswith(reading + ':'):
+        value = value[len(reading) + 1:].strip()
+    return event.get('device'), reading, value
@@ -0,0 +1,122 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker(object):
+    """Stops sending requests to a server that does not respond.
+
+    After failure_threshold failures in a row the breaker opens and
+    requests are rejected at once. After reset_timeout seconds a single
+    request is let through as a probe (half open): if it succeeds the
+    breaker closes, otherwise it opens again with the timeout doubled,
+    up to max_reset_timeout.
+    """
+
+    def __init__(self, failure_threshold=2, reset_timeout=5.0,
+                 max_reset_timeout=300.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.reset_timeout = reset_timeout
+        self.retry_at = 0
+
+    def available(self):
+        """True unless the breaker is open and no probe is due."""
+        return self.state != OPEN or self._clock() >= self.retry_at
+
+    def allow(self):
+        """Return True if a request may be sent now."""
+        if self.state == CLOSED:
+            return True
+        with self._lock:
+            if self.state == OPEN and self._clock() >= self.retry_at:
+                # let this request through as the probe
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                # probe failed, back off
+                self.reset_timeout = min(self.reset_timeout * 2,
+                                         self.max_reset_timeout)
+                self._open()
+            elif self.state == CLOSED and \
+                    self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.retry_at = self._clock() + self.reset_timeout
+
+
+class Watchdog(object):
+    """Calls probe() every interval seconds in a daemon thread.
+
+    probe() returns True when the server is healthy. on_recover() is
+    called when a probe succeeds after a failed one; pass healthy=False
+    if the server was already found to be down.
+    """
+
+    def __init__(self, probe, interval, on_recover=None, healthy=None):
+        self.probe = probe
+        self.interval = interval
+        self.on_recover = on_recover
+        self.healthy = healthy
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run,
+                                        name='FhemWatchdog')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        try:
+            healthy = bool(self.probe())
+        except Exception:
+            healthy = False
+        recovered = healthy and self.healthy is False
+        self.healthy = healthy
+        if recovered and self.on_recover:
+            self.on_recover()
+        return healthy
@@ -0,0 +1,203 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Minimum, maximum and mean of logged readings over whole days.
+
+The values come from the FileLog files of FHEM (streamed line by line)
+or from a DbLog SQLite database (aggregated by SQLite). Aggregates of
+past days can't change any more and are kept, so asking again, or for a
+longer period containing the same days, does not scan the logs again.
+"""
+
+import datetime
+import glob
+import logging
+import math
+import os
+import sqlite3
+import threading
+from array import array
+from collections import namedtuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+LOG = logging.getLogger(__name__)
+
+# below this number of values numpy is not worth the conversion
+_NUMPY_MIN = 64
+
+
+class Stats(namedtuple('Stats', ['min', 'max', 'sum', 'count'])):
+    """Aggregates of the values of one or more days."""
+
+    __slots__ = ()
+
+    @property
+    def mean(self):
+        return self.sum / self.count
+
+
+def aggregate(values):
+    """Return the Stats of an array('d') of values, None if it is
+    empty."""
+    if not values:
+        return None
+    if numpy is not None and len(values) >= _NUMPY_MIN:
+        a = numpy.frombuffer(values, dtype=numpy.float64)
+        return Stats(float(a.min()), float(a.max()), float(a.sum()), len(a))
+    return Stats(min(values), max(values), math.fsum(values), len(values))
+
+
+def combine(stats):
+    """Return the Stats of several days, None if none has values."""
+    stats = [s for s in stats if s is not None]
+    if not stats:
+        return None
+    return Stats(min(s.min for s in stats), max(s.max for s in stats),
+                 sum(s.sum for s in stats), sum(s.count for s in stats))
+
+
+def days(first, last):
+    """Yield the dates from first to last."""
+    day = first
+    while day <= last:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
+class FileLogSource(object):
+    """Reads FHEM FileLog files matching the glob pattern, whose lines
+    look like "2019-05-01_12:00:00 device reading: value"."""
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+
+    def _files(self, first):
+        # a file last written before the first day can't contain it
+        start = datetime.datetime.combine(first, datetime.time()).timestamp()
+        for path in sorted(glob.glob(self.pattern)):
+            try:
+                if os.path.getmtime(path) >= start:
+                    yield path
+            except OSError:
+                pass
+
+    def day_stats(self, device, reading, first, last):
+        """Return {date: Stats} of the days from first to last."""
+        needle = ' {} {}: '.format(device, reading)
+        # the timestamp has 19 characters, the date is its first 10
+        offset = 19 + len(needle)
+        first_s, last_s = first.isoformat(), last.isoformat()
+        values = {}
+        for path in self._files(first):
+            with open(path, encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    if line[19:offset] != needle:
+                        continue
+                    day = line[:10]
+                    if day < first_s or day > last_s:
+                        continue
+                    try:
+                        value = float(line[offset:].split(None, 1)[0])
+                    except (ValueError, IndexError):
+                        continue
+                    if day not in values:
+                        values[day] = array('d')
+                    values[day].append(value)
+        return dict((datetime.date(*map(int, day.split('-'))),
+                     aggregate(v)) for day, v in values.items())
+
+
+class DbLogSource(object):
+    """Reads the history table of a DbLog SQLite database."""
+
+    QUERY = ("SELECT substr(TIMESTAMP, 1, 10), MIN(CAST(VALUE AS REAL)), "
+             "MAX(CAST(VALUE AS REAL)), SUM(CAST(VALUE AS REAL)), COUNT(*) "
+             "FROM history WHERE DEVICE = ? AND READING = ? "
+             "AND TIMESTAMP >= ? AND TIMESTAMP < ? "
+             "AND VALUE GLOB '[0-9.-]*' GROUP BY 1")
+
+    def __init__(self, path):
+        self.path = path
+
+    def day_stats(self, device, reading, first, last):
+        """Return {date: Stats} of the days from first to last."""
+        end = last + datetime.timedelta(days=1)
+        db = sqlite3.connect('file:{}?mode=ro'.format(self.path), uri=True)
+        try:
+            rows = db.execute(self.QUERY, (device, reading,
+                                           first.isoformat(),
+                                           end.isoformat())).fetchall()
+        finally:
+            db.close()
+        return dict((datetime.date(*map(int, day.split('-'))),
+                     Stats(low, high, total, count))
+                    for day, low, high, total, count in rows)
+
+
+def source_for(path):
+    """DbLogSource for SQLite files, FileLogSource for anything else."""
+    if path.endswith(('.db', '.sqlite', '.sqlite3')):
+        return DbLogSource(path)
+    return FileLogSource(path)
+
+
+class History(object):
+    """Aggregates of a reading over periods of whole days."""
+
+    def __init__(self, source, today=datetime.date.today):
+        self.source = source
+        self._today = today
+        # (device, reading, date) -> Stats or None, past days only
+        self._days = {}
+        self._lock = threading.Lock()
+
+    def stats(self, device, reading, first, last):
+        """Return the Stats of reading of device from the first to the
+        last day (dates), None if nothing was logged."""
+        today = self._today()
+        last = min(last, today)
+        with self._lock:
+            missing = [d for d in days(first, last)
+                       if d >= today or (device, reading, d) not in self._days]
+            fetched = {}
+            if missing:
+                LOG.debug("scanning %s %s from %s to %s" %
+                          (device, reading, missing[0], missing[-1]))
+                fetched = self.source.day_stats(device, reading,
+                                                missing[0], missing[-1])
+                for d in missing:
+                    if d < today:
+                        self._days[(device, reading, d)] = fetched.get(d)
+            return combine(
+                fetched.get(d) if d >= today
+                else self._days[(device, reading, d)]
+                for d in days(first, last))
+
+
+def period(name, today):
+    """Return (first, last) date of the period today, yesterday, week
+    (since monday) or month."""
+    if name == 'yesterday':
+        day = today - datetime.timedelta(days=1)
+        return day, day
+    if name == 'week':
+        return today - datetime.timedelta(days=today.weekday()), today
+    if name == 'month':
+        return today.replace(day=1), today
+    return today, today
@@ -0,0 +1,135 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Resolving a spoken device or person name to a device of the cache.
+
+The thresholds are collected in a Scoring so that they can be tuned
+against the labelled corpus of benchmarks/bench_matching.py.
+"""
+
+from collections import namedtuple
+import logging
+import re
+
+from rapidfuzz import fuzz
+
+from .names import normalize
+
+LOG = logging.getLogger(__name__)
+
+# required_ratio_for_bonus: how closely the spoken room has to match the
+#     room of a device to add bonus to its score
+# min_score: a fuzzy match has to score above this
+# presence_ratio: a realname of a ROOMMATE has to match above this
+Scoring = namedtuple('Scoring', ['required_ratio_for_bonus', 'bonus',
+                                 'min_score', 'presence_ratio'])
+
+SCORING = Scoring(required_ratio_for_bonus=89, bonus=25, min_score=50,
+                  presence_ratio=66)
+
+# how is 'room' (the only device of the types in the room), 'exact' (a
+# name or alias), 'fuzzy' or None if nothing matched
+Match = namedtuple('Match', ['record', 'score', 'how'])
+
+NO_MATCH = Match(None, 0, None)
+
+
+def remove_words(text, words):
+    """Drop the words (e.g. articles and prepositions) from text."""
+    return " ".join(w for w in text.split(" ") if w and w not in words)
+
+
+def room_bonus(room, dev_room, scoring=SCORING):
+    if fuzz.ratio(room, dev_room) > scoring.required_ratio_for_bonus:
+        LOG.debug("bonus! {} {}".format(room, dev_room))
+        return scoring.bonus
+    return 0
+
+
+def fuzzy_match(device, candidates, room, rooms_of, scoring=SCORING):
+    """Return the Match of the candidate whose alias, or name followed by
+    its rooms, is most similar to device; a room similar to the first
+    room of a device adds a bonus."""
+    best = NO_MATCH
+    best_score = scoring.min_score
+    for dc in candidates:
+        norm_name = normalize(dc.name)
+        norm_name_list = norm_name.split(" ")
+        dev_room = rooms_of(dc)
+        for r in dev_room:
+            if r not in norm_name_list:
+                norm_name += " " + normalize(r)
+        bonus = room_bonus(room, dev_room[0], scoring) \
+            if room and dev_room else 0
+
+        names = [norm_name]
+        norm_alias = normalize(dc.dev_name)
+        if norm_name != norm_alias and dc.alias:
+            names.insert(0, norm_alias)
+        for name in names:
+            score = fuzz.token_sort_ratio(device, name) + bonus
+            if score > best_score:
+                best_score = score
+                best = Match(dc, score, 'fuzzy')
+    return best
+
+
+def match_device(device, allowed_types, room, cache, rooms_of,
+                 name_index=None, common_words=(), scoring=SCORING):
+    """Find the device of the DeviceCache cache that was meant by the
+    spoken device name and room.
+
+    allowed_types is a regular expression for the genericDeviceType,
+    rooms_of(dev) gives the normalized rooms of a DeviceRecord,
+    name_index is a NameIndex for exact names and common_words are
+    dropped from device and room first.
+    """
+    if room:
+        room = normalize(remove_words(room, common_words))
+    candidates = cache.filter(allowed_types, room)
+    if len(candidates) == 1:
+        # there is only one device of the allowed types in the room
+        return Match(candidates[0], 999, 'room')
+
+    # the name or alias of a device was said exactly (the device entity
+    # is trained with them): no need for fuzzy matching
+    if name_index is not None:
+        dc = name_index.lookup(
+            " ".join(normalize(remove_words(device, common_words)).split()),
+            re.compile(allowed_types, re.IGNORECASE), room)
+        if dc is not None:
+            return Match(dc, 100, 'exact')
+
+    # try again without filter on room
+    if room:
+        candidates = cache.filter(allowed_types)
+    return fuzzy_match(device, candidates, room, rooms_of, scoring)
+
+
+def match_person(wanted, roommates, scoring=SCORING):
+    """Return the Match of the ROOMMATE whose realname is most similar to
+    wanted, the score being the ratio."""
+    best = NO_MATCH
+    best_ratio = scoring.presence_ratio
+    for rm in roommates:
+        realname = rm.get('realname')
+        if not realname:
+            continue
+        ratio = fuzz.ratio(wanted.lower(), realname.lower(),
+                           score_cutoff=best_ratio)
+        if ratio > best_ratio:
+            best_ratio = ratio
+            best = Match(rm, ratio, 'fuzzy')
+    return best
@@ -0,0 +1,267 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+# upper bounds (seconds) of the default histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+
+
+class _Metric(object):
+    """Base of all metrics; a metric with labelnames is a family whose
+    values are kept per combination of label values (see labels())."""
+
+    typ = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children.setdefault(key, self._child())
+        return child
+
+    def samples(self):
+        """Yield (suffix, labels dict, value) of all values."""
+        if not self.labelnames:
+            for sample in self._samples({}):
+                yield sample
+            return
+        for key, child in list(self._children.items()):
+            for sample in child._samples(dict(zip(self.labelnames, key))):
+                yield sample
+
+
+class Counter(_Metric):
+    """Monotonically increasing value.
+
+    Updates are not locked: a lost increment under concurrent intents is
+    acceptable for statistics and keeps the intent path cheap.
+    """
+
+    typ = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super(Counter, self).__init__(name, documentation, labelnames)
+        self.value = 0
+
+    def _child(self):
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def _samples(self, labels):
+        yield '', labels, self.value
+
+
+class Gauge(_Metric):
+    """Value that can go up and down. If func is given it is called to
+    get the value when the metrics are exported."""
+
+    typ = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), func=None):
+        super(Gauge, self).__init__(name, documentation, labelnames)
+        self.value = 0
+        self._func = func
+
+    def _child(self):
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def _samples(self, labels):
+        yield '', labels, self._func() if self._func else self.value
+
+
+class Histogram(_Metric):
+    """Counts of observed values (e.g. durations) per bucket."""
+
+    typ = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # the last slot counts values above the largest bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def _child(self):
+        return Histogram(self.name, self.documentation,
+                         buckets=self.buckets)
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def _samples(self, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),),
+                                self.counts):
+            cumulative += count
+            le = dict(labels)
+            le['le'] = '+Inf' if bound == float('inf') else repr(bound)
+            yield '_bucket', le, cumulative
+        yield '_sum', labels, self.sum
+        yield '_count', labels, self.count
+
+
+class MetricsRegistry(object):
+    """Named metrics of the skill, created on first use."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _get(self, cls, name, documentation, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics.setdefault(
+                name, cls(name, documentation, **kwargs))
+        return metric
+
+    def counter(self, name, documentation="", labelnames=()):
+        return self._get(Counter, name, documentation,
+                         labelnames=labelnames)
+
+    def gauge(self, name, documentation="", labelnames=(), func=None):
+        return self._get(Gauge, name, documentation, labelnames=labelnames,
+                         func=func)
+
+    def histogram(self, name, documentation="", labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, documentation,
+                         labelnames=labelnames, buckets=buckets)
+
+    def metrics(self):
+        return list(self._metrics.values())
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', r'\\')
+                         .replace('"', r'\"').replace('\n', r'\n'))
+        for k, v in sorted(labels.items())) + '}'
+
+
+def render_prometheus(registry):
+    """Return all metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in sorted(registry.metrics(), key=lambda m: m.name):
+        lines.append('# HELP {} {}'.format(metric.name,
+                                           metric.documentation))
+        lines.append('# TYPE {} {}'.format(metric.name, metric.typ))
+        for suffix, labels, value in metric.samples():
+            lines.append('{}{}{} {}'.format(metric.name, suffix,
+                                            _format_labels(labels),
+                                            float(value)))
+    return '\n'.join(lines) + '\n'
+
+
+def render_json(registry):
+    """Return all metrics as JSON: name -> list of samples."""
+    data = {'timestamp': time.time(), 'metrics': {}}
+    for metric in registry.metrics():
+        data['metrics'][metric.name] = [
+            {'name': metric.name + suffix, 'labels': labels, 'value': value}
+            for suffix, labels, value in metric.samples()]
+    return json.dumps(data, sort_keys=True)
+
+
+class MetricsServer(object):
+    """Minimal HTTP server exporting the registry on /metrics
+    (Prometheus text) and /metrics.json, run in a daemon thread."""
+
+    def __init__(self, registry, port, host='127.0.0.1'):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._httpd = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body = render_prometheus(registry)
+                    ctype = 'text/plain; version=0.0.4; charset=utf-8'
+                elif self.path == '/metrics.json':
+                    body = render_json(registry)
+                    ctype = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        self._httpd = Server((self.host, self.port), Handler)
+        # port 0 lets the system choose a free port
+        self.port = self._httpd.server_address[1]
+        thread = threading.Thread(target=self._httpd.serve_forever,
+                                  name='FhemMetricsServer')
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
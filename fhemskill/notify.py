@@ -0,0 +1,238 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Spoken notifications on FHEM events.
+
+Rules are read from a JSON list like
+
+    [{"device": "front_door", "value": "open",
+      "say": "The front door was opened"},
+     {"type": "window", "value": "open",
+      "while": {"device": "heating", "value": "on"},
+      "say": "{dev_name} is open while the heating is on"},
+     {"device": "washer", "reading": "power", "below": 3,
+      "debounce": 600, "say": "The washing machine has finished"}]
+
+A rule selects events by device name, genericDeviceType ("type") or
+room, and reading ("state" if not given). It fires when the value
+becomes equal to "value", above "above" or below "below" (or on every
+change without those), optionally only "while" another device's reading
+matches. It then fires again only after the condition was false in
+between and "debounce" seconds (default 60) have passed. During quiet
+hours only rules with "urgent" are announced.
+"""
+
+import datetime
+import logging
+import time
+
+from .events import parse_event
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE = 60
+
+
+def _number(value):
+    try:
+        return float(str(value).split(None, 1)[0])
+    except (ValueError, IndexError):
+        return None
+
+
+class Condition(object):
+    """A reading value test: equal to value, above or below a number."""
+
+    def __init__(self, value=None, above=None, below=None):
+        self.value = None if value is None else str(value)
+        self.above = above
+        self.below = below
+
+    @property
+    def always(self):
+        return self.value is None and self.above is None and \
+            self.below is None
+
+    def __call__(self, value, number=None):
+        # number: value as parsed by _number(), if the caller has it
+        if self.value is not None and str(value) != self.value:
+            return False
+        if self.above is not None or self.below is not None:
+            if number is None:
+                number = _number(value)
+            if number is None:
+                return False
+            if self.above is not None and number <= self.above:
+                return False
+            if self.below is not None and number >= self.below:
+                return False
+        return True
+
+
+class Rule(object):
+
+    def __init__(self, say, device=None, type=None, room=None,
+                 reading='state', value=None, above=None, below=None,
+                 debounce=DEFAULT_DEBOUNCE, urgent=False, condition=None):
+        self.say = say
+        self.device = device
+        self.type = type
+        self.room = room.lower() if room else None
+        self.reading = reading
+        self.test = Condition(value, above, below)
+        self.debounce = debounce
+        self.urgent = urgent
+        # (device, reading, Condition) that must hold as well
+        self.condition = condition
+
+    @classmethod
+    def from_dict(cls, d):
+        condition = None
+        if d.get('while'):
+            w = d['while']
+            condition = (w['device'], w.get('reading', 'state'),
+                         Condition(w.get('value'), w.get('above'),
+                                   w.get('below')))
+        return cls(d['say'], device=d.get('device'), type=d.get('type'),
+                   room=d.get('room'), reading=d.get('reading', 'state'),
+                   value=d.get('value'), above=d.get('above'),
+                   below=d.get('below'),
+                   debounce=d.get('debounce', DEFAULT_DEBOUNCE),
+                   urgent=d.get('urgent', False), condition=condition)
+
+
+def parse_quiet_hours(text):
+    """Return (start, end) times of "22:00-07:00", None if empty."""
+    if not text or not text.strip():
+        return None
+    start, end = text.split('-')
+    return tuple(datetime.datetime.strptime(t.strip(), '%H:%M').time()
+                 for t in (start, end))
+
+
+def in_quiet_hours(quiet_hours, now):
+    if quiet_hours is None:
+        return False
+    start, end = quiet_hours
+    if start <= end:
+        return start <= now < end
+    # over midnight
+    return now >= start or now < end
+
+
+class Notifier(object):
+    """Matches events against the rules and announces them.
+
+    The rules are indexed by (device, reading), (type, reading) and
+    (room, reading), so an event only looks at the rules that can match
+    it, however many there are. lookup(name) returns the cached
+    DeviceRecord of a device (or None), announce(text) speaks.
+    """
+
+    def __init__(self, rules, lookup, announce, quiet_hours=None,
+                 clock=time.monotonic, now=datetime.datetime.now):
+        self.lookup = lookup
+        self.announce = announce
+        self.quiet_hours = quiet_hours
+        self._clock = clock
+        self._now = now
+        self._by_device = {}
+        self._by_type = {}
+        self._by_room = {}
+        self._any = {}
+        # the readings the rules test, "while" conditions included
+        self.readings = set()
+        for rule in rules:
+            self.readings.add(rule.reading)
+            if rule.condition is not None:
+                self.readings.add(rule.condition[1])
+            # indexed by the most specific key, the others are checked
+            # when the rule is a candidate
+            if rule.device:
+                index, key = self._by_device, rule.device
+            elif rule.type:
+                index, key = self._by_type, rule.type
+            elif rule.room:
+                index, key = self._by_room, rule.room
+            else:
+                index, key = self._any, None
+            index.setdefault((key, rule.reading), []).append(rule)
+        # (rule, device) pairs whose condition currently holds
+        self._active = set()
+        # (rule, device) -> clock time of the last announcement
+        self._fired = {}
+
+    def _candidates(self, device, record, rooms, reading):
+        rules = list(self._by_device.get((device, reading), ()))
+        if record is not None:
+            rules += self._by_type.get((record.generic_type, reading), ())
+            for room in rooms:
+                rules += self._by_room.get((room, reading), ())
+        rules += self._any.get((None, reading), ())
+        return rules
+
+    def _matches(self, rule, device, record, rooms, value, number):
+        if rule.device and rule.device != device:
+            return False
+        if rule.type and (record is None or
+                          record.generic_type != rule.type):
+            return False
+        if rule.room and rule.room not in rooms:
+            return False
+        if not rule.test(value, number):
+            return False
+        if rule.condition is not None:
+            other, reading, test = rule.condition
+            other_record = self.lookup(other)
+            if other_record is None or \
+                    reading not in other_record.readings or \
+                    not test(other_record.readings[reading]):
+                return False
+        return True
+
+    def handle(self, event):
+        """Handle an event dict of python_fhem's FhemEventQueue (with
+        raw_value=True); return the announced texts."""
+        device, reading, value = parse_event(event)
+        record = self.lookup(device)
+        rooms = [r.lower() for r in record.rooms] if record else []
+        number = _number(value)
+        announced = []
+        for rule in self._candidates(device, record, rooms, reading):
+            key = (id(rule), device)
+            if not self._matches(rule, device, record, rooms, value,
+                                 number):
+                self._active.discard(key)
+                continue
+            if key in self._active and not rule.test.always:
+                # still true since the last event, not a new occurrence
+                continue
+            self._active.add(key)
+            now = self._clock()
+            last = self._fired.get(key)
+            if last is not None and now - last < rule.debounce:
+                continue
+            if not rule.urgent and \
+                    in_quiet_hours(self.quiet_hours, self._now().time()):
+                LOG.debug("quiet hours, not announcing %s" % rule.say)
+                continue
+            self._fired[key] = now
+            text = rule.say.format(
+                dev_name=record.dev_name if record else device,
+                device=device, value=value,
+                room=", ".join(record.rooms) if record else "")
+            announced.append(text)
+            self.announce(text)
+        return announced
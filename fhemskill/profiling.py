@@ -0,0 +1,130 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from functools import wraps
+
+# number of entries written to the text reports
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+
+
+def parse_options(count, sample_rate):
+    """Return count and sample rate given as settings or message data,
+    None if they are invalid. A missing sample rate means 1.0, 0 is
+    taken as given."""
+    try:
+        count = int(count or 0)
+        if sample_rate is None or sample_rate == '':
+            sample_rate = 1.0
+        sample_rate = float(sample_rate)
+    except (TypeError, ValueError):
+        return None
+    return count, sample_rate
+
+
+class Profiler(object):
+    """Runs the next calls under cProfile and tracemalloc and writes the
+    results to directory.
+
+    start(count, sample_rate) arms the profiler for count calls; each
+    call is picked with probability sample_rate, so it can stay armed
+    in production at low overhead. Only one call is profiled at a time,
+    calls arriving meanwhile run unprofiled.
+    """
+
+    def __init__(self, directory, rand=random.random):
+        self.directory = directory
+        self._rand = rand
+        self._busy = threading.Lock()
+        self.remaining = 0
+        self.sample_rate = 1.0
+        # keeps file names of calls within the same second apart
+        self._sequence = itertools.count(1)
+
+    def start(self, count, sample_rate=1.0):
+        self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+        self.remaining = max(0, int(count))
+
+    def stop(self):
+        self.remaining = 0
+
+    @property
+    def active(self):
+        return self.remaining > 0
+
+    def call(self, name, func, *args, **kwargs):
+        if self.remaining <= 0 or self._rand() >= self.sample_rate or \
+                not self._busy.acquire(False):
+            return func(*args, **kwargs)
+        try:
+            self.remaining -= 1
+            return self._profile(name, func, args, kwargs)
+        finally:
+            self._busy.release()
+
+    def _profile(self, name, func, args, kwargs):
+        trace = not tracemalloc.is_tracing()
+        if trace:
+            tracemalloc.start()
+        elif hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if trace:
+                tracemalloc.stop()
+            self._write(name, duration, profile, snapshot, peak)
+
+    def _write(self, name, duration, profile, snapshot, peak):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        base = os.path.join(self.directory, '{}-{}-{}'.format(
+            time.strftime('%Y%m%d-%H%M%S'), next(self._sequence), name))
+        profile.dump_stats(base + '.prof')
+
+        out = io.StringIO()
+        out.write('{} took {:.3f}s, peak traced memory {} KiB\n\n'.format(
+            name, duration, peak // 1024))
+        stats = pstats.Stats(profile, stream=out)
+        stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        out.write('\nTop allocation sites:\n')
+        for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+            out.write('{}\n'.format(stat))
+        with open(base + '.txt', 'w') as f:
+            f.write(out.getvalue())
+
+
+def profiled(func):
+    """Decorator for skill methods: run the call through the skill's
+    profiler (self.profiler), which decides whether to profile it."""
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        return self.profiler.call(func.__name__, func, self, *args,
+                                  **kwargs)
+    return wrapper
@@ -0,0 +1,138 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+
+# the only parts of a jsonlist2 record the skill uses
+KEPT_READINGS = ('state', 'pct', 'dim', 'brightness', 'presence',
+                 'desired-temp', 'desiredTemperature', 'desired', 'FBTYPE')
+KEPT_SETS = ('pct', 'dim', 'brightness')
+KEPT_INTERNALS = ('channel_04', 'REGEXP')
+KEPT_ATTRIBUTES = ('homebridgeMapping',)
+
+_intern = sys.intern
+
+
+class DeviceRecord(object):
+    """Compact projection of a jsonlist2 device record.
+
+    Names, types and rooms are interned, so the thousands of devices of
+    a large installation share those strings. readings holds the values
+    (without timestamps) of KEPT_READINGS only; rarely used fields like
+    the LightScene scenes or thermostat internals are in extra, which is
+    None for most devices.
+    """
+
+    __slots__ = ('name', 'alias', 'rooms', 'generic_type', 'type',
+                 'readings', 'sets', 'extra')
+
+    def __init__(self, name, alias=None, rooms=(), generic_type='',
+                 type='', readings=None, sets=(), extra=None):
+        self.name = name
+        self.alias = alias
+        self.rooms = rooms
+        self.generic_type = generic_type
+        self.type = type
+        self.readings = readings if readings is not None else {}
+        self.sets = sets
+        self.extra = extra
+
+    @property
+    def dev_name(self):
+        """The alias or, if there is none, the name."""
+        return self.alias or self.name
+
+    @property
+    def state(self):
+        return self.readings.get('state', '')
+
+    def get(self, key, default=None):
+        # for the fields in extra
+        if self.extra is None:
+            return default
+        return self.extra.get(key, default)
+
+    def __repr__(self):
+        return 'DeviceRecord({!r}, type={!r}, state={!r})'.format(
+            self.name, self.type, self.state)
+
+
+def project(raw, kept_readings=KEPT_READINGS):
+    """Create a DeviceRecord from a jsonlist2 device dict, keeping the
+    values of the readings in kept_readings."""
+    internals = raw.get('Internals', {})
+    attributes = raw.get('Attributes', {})
+    readings = raw.get('Readings', {})
+
+    extra = {}
+    for key in KEPT_INTERNALS:
+        if key in internals:
+            extra[key] = internals[key]
+    for key in KEPT_ATTRIBUTES:
+        if key in attributes:
+            extra[key] = attributes[key]
+    if 'rr_realname' in attributes:
+        # ROOMMATE: the attribute rr_realname names the attribute
+        # holding the name of the person
+        extra['realname'] = attributes.get(attributes['rr_realname'], '')
+
+    sets = []
+    for s in raw.get('PossibleSets', '').split(' '):
+        cmd, _, args = s.partition(':')
+        if cmd in KEPT_SETS:
+            sets.append(_intern(cmd))
+            # "brightness:slider,0,1,254": a level that isn't percent
+            slider = args.split(',')
+            if len(slider) == 4 and slider[0] == 'slider' and \
+                    slider[3] != '100':
+                try:
+                    extra[cmd + '_max'] = float(slider[3])
+                except ValueError:
+                    pass
+        elif cmd == 'scene':
+            # LightScene: "scene:name1,name2"
+            extra['scenes'] = tuple(a for a in args.split(',') if a)
+
+    rooms = attributes.get('room')
+    return DeviceRecord(
+        _intern(raw['Name']),
+        alias=attributes.get('alias'),
+        rooms=tuple(_intern(r) for r in rooms.split(',')) if rooms else (),
+        generic_type=_intern(attributes.get('genericDeviceType', '')),
+        type=_intern(internals.get('TYPE', '')),
+        readings=dict((_intern(k), readings[k]['Value'])
+                      for k in kept_readings if k in readings),
+        sets=tuple(sets),
+        extra=extra or None)
+
+
+def dump(record):
+    """Return the fields of record as a JSON serializable list."""
+    return [record.name, record.alias, record.rooms, record.generic_type,
+            record.type, record.readings, record.sets, record.extra]
+
+
+def load(fields):
+    """Create a DeviceRecord from a list returned by dump()."""
+    name, alias, rooms, generic_type, dev_type, readings, sets, extra = \
+        fields
+    if extra and 'scenes' in extra:
+        extra['scenes'] = tuple(extra['scenes'])
+    return DeviceRecord(
+        _intern(name), alias=alias,
+        rooms=tuple(_intern(r) for r in rooms),
+        generic_type=_intern(generic_type), type=_intern(dev_type),
+        readings=dict((_intern(k), v) for k, v in readings.items()),
+        sets=tuple(_intern(s) for s in sets), extra=extra)
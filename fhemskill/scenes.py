@@ -0,0 +1,95 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from collections import namedtuple
+
+from .names import normalize
+
+# FHEM modules whose devices can be activated by the automation intent
+SCENE_TYPES = ('LightScene', 'structure', 'DOIF', 'notify')
+
+Scene = namedtuple('Scene', ['name', 'dev_name', 'room', 'cmd'])
+
+# a notify REGEXP that is a plain "device:event" and can be triggered
+_literal_notify = re.compile(r'^([\w.-]+):([\w.-]+)$')
+
+
+def scene_commands(dev):
+    """Return (spoken name, FHEM command) of everything the DeviceRecord
+    dev can activate."""
+    if dev.type == 'LightScene':
+        for scene in dev.get('scenes', ()):
+            yield scene, 'set {} scene {}'.format(dev.name, scene)
+    elif dev.type == 'structure':
+        yield dev.dev_name, 'set {} on'.format(dev.name)
+    elif dev.type == 'DOIF':
+        yield dev.dev_name, 'set {} cmd_1'.format(dev.name)
+    elif dev.type == 'notify':
+        m = _literal_notify.match(dev.get('REGEXP', ''))
+        if m:
+            yield dev.dev_name, 'trigger {} {}'.format(m.group(1),
+                                                       m.group(2))
+
+
+class SceneIndex(object):
+    """Scenes, structures and DOIF/notify devices keyed by normalized
+    name and room, so activating one is a dictionary lookup.
+
+    rooms_of(dev) returns the (normalized) rooms of a DeviceRecord.
+    """
+
+    def __init__(self, devices, rooms_of):
+        self._by_room = {}
+        self._by_name = {}
+        self.rooms = set()
+        for dev in devices:
+            if dev.type not in SCENE_TYPES:
+                continue
+            rooms = rooms_of(dev) or [""]
+            for dev_name, cmd in scene_commands(dev):
+                key = " ".join(normalize(dev_name).split())
+                for room in rooms:
+                    scene = Scene(dev.name, dev_name, room, cmd)
+                    self._by_room.setdefault((key, room), scene)
+                    self._by_name.setdefault(key, []).append(scene)
+                    if room:
+                        self.rooms.add(room)
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def names(self):
+        return list(self._by_name.keys())
+
+    def lookup(self, text, room=""):
+        """Return the Scene for the spoken text or None.
+
+        A room at the end of text ("movie in living room") takes
+        precedence over the room argument.
+        """
+        words = normalize(text).split()
+        for i in range(1, len(words)):
+            suffix = " ".join(words[i:])
+            if suffix in self.rooms:
+                words, room = words[:i], suffix
+                break
+        key = " ".join(words)
+        if (key, room) in self._by_room:
+            return self._by_room[(key, room)]
+        scenes = self._by_name.get(key)
+        if scenes:
+            return scenes[0]
+        return None
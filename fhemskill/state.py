@@ -0,0 +1,90 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import threading
+from collections import namedtuple
+
+# everything _setup derives from the settings, replaced as a whole when
+# the settings change
+Connection = namedtuple('Connection', [
+    'fhem', 'device_cache', 'device_sync', 'allowed_devices_room',
+    'ignore_rooms', 'enable_fallback', 'fallback_device_name',
+    'fallback_device_type', 'device_location', 'history'])
+
+DISCONNECTED = Connection(
+    fhem=None, device_cache=None, device_sync=None,
+    allowed_devices_room='Homebridge', ignore_rooms='',
+    enable_fallback=False, fallback_device_name='',
+    fallback_device_type=None, device_location='', history=None)
+
+
+class SharedState(object):
+    """Holds the current Connection, shared by concurrent intents.
+
+    Connections are immutable and replaced by a single assignment, so
+    reading one needs no lock. A handler pins the Connection it started
+    with, every read of the same thread then returns it even if the
+    settings change meanwhile; only a swap done by that thread itself
+    (the handler running the setup) replaces the pinned one.
+    """
+
+    def __init__(self, initial=DISCONNECTED):
+        self._current = initial
+        self._local = threading.local()
+        # serializes the writers only
+        self.lock = threading.RLock()
+
+    def current(self):
+        return getattr(self._local, 'pinned', None) or self._current
+
+    def swap(self, connection):
+        with self.lock:
+            self._current = connection
+        if getattr(self._local, 'pinned', None) is not None:
+            self._local.pinned = connection
+
+    def update(self, **changes):
+        """Swap in a copy of the current Connection with changes."""
+        with self.lock:
+            self.swap(self._current._replace(**changes))
+
+    def pin(self):
+        return _Pin(self)
+
+
+class _Pin(object):
+
+    def __init__(self, state):
+        self._state = state
+
+    def __enter__(self):
+        local = self._state._local
+        # nested pins (e.g. a handler calling another) keep the outer one
+        self._outer = getattr(local, 'pinned', None)
+        local.pinned = self._outer or self._state._current
+        return local.pinned
+
+    def __exit__(self, *exc):
+        self._state._local.pinned = self._outer
+
+
+def pinned(func):
+    """Run the handler method func with self.state pinned."""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.state.pin():
+            return func(self, *args, **kwargs)
+    return wrapper
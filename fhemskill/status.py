@@ -0,0 +1,104 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Status summaries of many devices at once, from their cached state.
+
+Sensors report several values in their state ("T: 21.3 H: 45"), contacts
+and switches a single word ("closed"). States repeat a lot across a
+house, so parsing is cached per state string.
+"""
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# the abbreviations sensors use in their state, see handle_sensor_intent
+TOKEN_NAMES = {
+    't': 'temperature', 'temp': 'temperature', 'temperatur': 'temperature',
+    'temperature': 'temperature', 'measured-temp': 'temperature',
+    'h': 'humidity', 'hum': 'humidity', 'humidity': 'humidity',
+    'p': 'pressure', 'pamb': 'pressure', 'press': 'pressure',
+    'pressure': 'pressure',
+}
+
+# generic types whose plain numeric state is a temperature
+_THERMOMETERS = ('thermometer', 'thermostat')
+
+_token = re.compile(r'([A-Za-z][\w-]*):\s*(-?\d+(?:[.,]\d+)?)')
+_number = re.compile(r'\s*(-?\d+(?:[.,]\d+)?)(?:\s*\S*)?\s*$')
+
+# the numeric values of one reading over all devices: lowest and highest
+# value with their devices, mean and number of devices
+Range = namedtuple('Range', ['reading', 'low', 'low_device', 'high',
+                             'high_device', 'mean', 'count'])
+
+
+@lru_cache(maxsize=1024)
+def parse_state(state):
+    """Return the ((reading, value), ...) of a state like "T: 21.3 H: 45",
+    (('value', 21.5),) of a plain number and () of anything else."""
+    tokens = _token.findall(state)
+    if tokens:
+        return tuple((TOKEN_NAMES.get(name.lower(), name.lower()),
+                      float(value.replace(',', '.')))
+                     for name, value in tokens)
+    m = _number.match(state)
+    if m:
+        return (('value', float(m.group(1).replace(',', '.'))),)
+    return ()
+
+
+def collect(records):
+    """Sort the states of records into numeric readings and plain states.
+
+    Returns ({reading: [(value, record), ...]}, {state: [record, ...]}).
+    """
+    readings = {}
+    states = {}
+    for rec in records:
+        values = parse_state(rec.state)
+        if not values:
+            states.setdefault(rec.state, []).append(rec)
+            continue
+        for reading, value in values:
+            if reading == 'value' and rec.generic_type in _THERMOMETERS:
+                reading = 'temperature'
+            readings.setdefault(reading, []).append((value, rec))
+    return readings, states
+
+
+def ranges(readings):
+    """Return a Range per reading of the readings returned by collect()."""
+    result = []
+    for reading, values in sorted(readings.items()):
+        low = min(values, key=lambda v: v[0])
+        high = max(values, key=lambda v: v[0])
+        mean = sum(v[0] for v in values) / len(values)
+        result.append(Range(reading, low[0], low[1], high[0], high[1],
+                            mean, len(values)))
+    return result
+
+
+def majority(states, max_exceptions=3):
+    """Return (state, [records with another state]) if all but
+    max_exceptions of the records share a state, else None."""
+    if not states:
+        return None
+    state = max(states, key=lambda s: len(states[s]))
+    exceptions = [rec for s, recs in states.items() if s != state
+                  for rec in recs]
+    if len(exceptions) > max_exceptions:
+        return None
+    return state, exceptions
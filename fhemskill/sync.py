@@ -0,0 +1,191 @@
+# Copyright 2018-2019, domcross
+# Github https://github.com/domcross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import logging
+import re
+import time
+
+from .records import KEPT_READINGS, project
+
+LOG = logging.getLogger(__name__)
+
+# seconds after which a full reload is done even if nothing seems to have
+# changed, as a safety net
+DEFAULT_FULL_INTERVAL = 3600
+
+# FHEM devspecs can't filter on reading timestamps, so the changed devices
+# are selected by a perl expression. It returns the server time, FHEM's
+# structural change counter ($lastDefChange, increased by define, delete,
+# rename and attr), the number of devices matching the devspec and the
+# names of those with a reading newer than the given time.
+DELTA_QUERY = (
+    '{{my @d=devspec2array("{devspec}");'
+    'my @c=grep{{my $r=($defs{{$_}}&&$defs{{$_}}{{READINGS}})||{{}};'
+    'grep{{($r->{{$_}}{{TIME}}||"") ge "{since}"}}keys %$r}}@d;'
+    'join("\\n",TimeNow(),$lastDefChange,scalar(@d),join(",",@c))}}')
+
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'[ \t\n\r]*')
+
+
+def iter_results(text):
+    """Yield the device dicts of the jsonlist2 response text one by one.
+
+    Only one device is decoded at a time, so the caller can project and
+    drop it before the next one is built, instead of holding the decoded
+    document of all devices like json.loads(). Raises ValueError if the
+    text is not a jsonlist2 response.
+    """
+    # "Results" is the only key of the response holding an array; a
+    # quote inside a JSON string is escaped, so the key can't be found
+    # in the "Arg" string before it
+    start = text.find('"Results"')
+    if start < 0:
+        raise ValueError("no Results in jsonlist2 response")
+    pos = _whitespace.match(text, start + len('"Results"')).end()
+    if text[pos:pos + 1] != ':':
+        raise ValueError("invalid jsonlist2 response at {}".format(pos))
+    pos = _whitespace.match(text, pos + 1).end()
+    if text[pos:pos + 1] != '[':
+        raise ValueError("invalid jsonlist2 response at {}".format(pos))
+    pos = _whitespace.match(text, pos + 1).end()
+    if text[pos:pos + 1] == ']':
+        return
+    while True:
+        dev, pos = _decoder.raw_decode(text, pos)
+        yield dev
+        pos = _whitespace.match(text, pos).end()
+        sep = text[pos:pos + 1]
+        pos = _whitespace.match(text, pos + 1).end()
+        if sep == ']':
+            return
+        if sep != ',':
+            raise ValueError("invalid jsonlist2 response at {}".format(pos))
+
+
+def jsonlist2(send_cmd, devspec, kept_readings=KEPT_READINGS):
+    """Return the DeviceRecords of a jsonlist2 request.
+
+    The response is parsed one device at a time and each device is
+    projected right away. Raises ConnectionError if the server did not
+    answer, an invalid answer is logged and gives [].
+    """
+    response = send_cmd("jsonlist2 {}".format(devspec))
+    if not response:
+        raise ConnectionError("no response to jsonlist2 {}".format(devspec))
+    if isinstance(response, bytes):
+        response = response.decode('utf-8', 'replace')
+    try:
+        return [project(dev, kept_readings)
+                for dev in iter_results(response)]
+    except (ValueError, KeyError) as e:
+        LOG.error("invalid jsonlist2 response: {}".format(e))
+        return []
+
+
+class DeltaSync(object):
+    """Keeps DeviceRecords of the devices in devspec up to date.
+
+    The first fetch() loads all records. Later calls ask the server which
+    devices have readings newer than the previous sync and only load
+    those. If the structural version or the number of devices changed
+    (new, deleted or renamed devices, changed attributes) or the last
+    full load is older than full_interval, everything is loaded again.
+    With delta=False every fetch() is a full load. The records keep the
+    readings in kept_readings.
+    """
+
+    def __init__(self, send_cmd, devspec,
+                 full_interval=DEFAULT_FULL_INTERVAL, delta=True,
+                 clock=time.monotonic, metrics=None,
+                 kept_readings=KEPT_READINGS):
+        self._send_cmd = send_cmd
+        self.devspec = devspec
+        self.kept_readings = kept_readings
+        self.full_interval = full_interval
+        self._clock = clock
+        self._devices = {}
+        self.version = None
+        self._count = None
+        self._since = None
+        self._full_at = None
+        # cleared when the server does not answer the delta query
+        self.delta_supported = delta
+        self._syncs = None
+        if metrics is not None:
+            self._syncs = metrics.counter(
+                'fhem_sync_total', 'Device list syncs by mode',
+                labelnames=('mode',))
+            self._transferred = metrics.counter(
+                'fhem_sync_devices_total',
+                'Device records transferred by syncs')
+
+    def _query(self):
+        """Return (server time, version, device count, changed names)
+        or None if the answer can't be parsed."""
+        response = self._send_cmd(DELTA_QUERY.format(
+            devspec=self.devspec, since=self._since or ""))
+        if not response:
+            raise ConnectionError("no response to delta query")
+        if isinstance(response, bytes):
+            response = response.decode('utf-8', 'replace')
+        lines = response.strip().split("\n")
+        try:
+            now, version, count = lines[0], lines[1], int(lines[2])
+        except (IndexError, ValueError):
+            # e.g. perl commands are not allowed for this user
+            LOG.warning("delta sync not supported by server: %s" % response)
+            self.delta_supported = False
+            return None
+        changed = [n for n in (lines[3] if len(lines) > 3 else "").split(",")
+                   if n]
+        return now, version, count, changed
+
+    def fetch(self):
+        """Sync with the server and return the list of all DeviceRecords."""
+        full_due = self._full_at is None or \
+            self._clock() - self._full_at > self.full_interval
+        state = self._query() if self.delta_supported else None
+        if state is None:
+            self._full()
+            return list(self._devices.values())
+
+        now, version, count, changed = state
+        if full_due or version != self.version or count != self._count:
+            self._full()
+        elif changed:
+            records = jsonlist2(self._send_cmd, ",".join(changed),
+                                self.kept_readings)
+            for dev in records:
+                self._devices[dev.name] = dev
+            self._count_sync('delta', len(records))
+        else:
+            self._count_sync('unchanged', 0)
+        self.version, self._count, self._since = version, count, now
+        return list(self._devices.values())
+
+    def _full(self):
+        records = jsonlist2(self._send_cmd, self.devspec,
+                            self.kept_readings)
+        self._devices = dict((dev.name, dev) for dev in records)
+        self._full_at = self._clock()
+        self._count_sync('full', len(records))
+
+    def _count_sync(self, mode, transferred):
+        if self._syncs is not None:
+            self._syncs.labels(mode=mode).inc()
+            self._transferred.inc(transferred)
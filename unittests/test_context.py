@@ -0,0 +1,73 @@
+from unittest import TestCase
+import unittest
+
+from fhemskill.cache import DeviceCache
+from fhemskill.context import DeviceContext, Handle, room_targets
+from fhemskill.records import DeviceRecord
+
+devices = [
+    DeviceRecord('kitchen_lamp', alias='Kitchen Lamp',
+                 rooms=('Homebridge', 'Kitchen'), generic_type='light'),
+    DeviceRecord('bedroom_lamp', alias='Ceiling Light',
+                 rooms=('Homebridge', 'Bedroom'), generic_type='light'),
+    DeviceRecord('bedroom_fan', alias='Fan',
+                 rooms=('Homebridge', 'Bedroom'), generic_type='outlet'),
+    DeviceRecord('bedroom_radio', alias='Radio',
+                 rooms=('Homebridge', 'Bedroom'), generic_type='switch'),
+    DeviceRecord('blind_left', rooms=('Homebridge', 'Bedroom'),
+                 generic_type='blind'),
+    DeviceRecord('blind_right', rooms=('Homebridge', 'Bedroom'),
+                 generic_type='blind'),
+    DeviceRecord('blind_kitchen', rooms=('Homebridge', 'Kitchen'),
+                 generic_type='blind'),
+]
+
+
+class TestDeviceContext(TestCase):
+
+    def test_expiry(self):
+        now = [0]
+        context = DeviceContext(expiry=120, clock=lambda: now[0])
+        self.assertIsNone(context.recall())
+        context.remember([Handle('lamp', 'Kitchen Lamp')], 'light', 'on')
+        now[0] = 100
+        self.assertEqual(context.recall().handles[0].id, 'lamp')
+        self.assertEqual(context.recall().cmd, 'on')
+        now[0] = 121
+        self.assertIsNone(context.recall())
+
+
+class TestRoomTargets(TestCase):
+
+    def setUp(self):
+        self.cache = DeviceCache(lambda: devices)
+        self.context = DeviceContext()
+
+    def test_same_type(self):
+        # "turn on the kitchen lamp" - "and the one in the bedroom":
+        # the fan and the radio are switchable too, but not lights
+        self.context.remember([Handle('kitchen_lamp', 'Kitchen Lamp')],
+                              '(light|switch|outlet)', 'on')
+        self.assertEqual(
+            room_targets(self.context.recall(), self.cache, 'bedroom'),
+            [Handle('bedroom_lamp', 'Ceiling Light')])
+        self.assertEqual(
+            room_targets(self.context.recall(), self.cache, 'hall'), [])
+
+    def test_ambiguous(self):
+        self.context.remember([Handle('blind_kitchen', 'blind_kitchen')],
+                              'blind', 'open')
+        self.assertEqual(
+            room_targets(self.context.recall(), self.cache, 'bedroom'), [])
+
+    def test_group(self):
+        # "open all blinds in the kitchen" - "and the ones in the bedroom"
+        self.context.remember([Handle('blind_kitchen', 'blind_kitchen')],
+                              'blind', 'open', group=True)
+        handles = room_targets(self.context.recall(), self.cache, 'bedroom')
+        self.assertEqual(sorted(h.id for h in handles),
+                         ['blind_left', 'blind_right'])
+
+
+if __name__ == '__main__':
+    unittest.main()
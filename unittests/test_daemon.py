@@ -0,0 +1,116 @@
+from unittest import TestCase
+import io
+import os
+import socket
+import tempfile
+import unittest
+
+from fhemskill.cache import DeviceCache
+from fhemskill.daemon import CacheServer, DaemonClient, parse_address
+from fhemskill.records import project
+
+lamp = {'Name': 'lamp', 'PossibleSets': 'on off pct:slider,0,1,100',
+        'Internals': {'TYPE': 'HUEDevice'},
+        'Readings': {'state': {'Value': 'off', 'Time': ''}},
+        'Attributes': {'alias': 'Lamp', 'room': 'Homebridge,Kitchen',
+                       'genericDeviceType': 'light'}}
+
+
+class TestDaemon(TestCase):
+
+    def setUp(self):
+        self.fetches = 0
+
+        def fetch():
+            self.fetches += 1
+            return [project(lamp)]
+        self.cache = DeviceCache(fetch, ttl=60)
+        self.tmp = tempfile.mkdtemp()
+        self.server = CacheServer(self.cache,
+                                  os.path.join(self.tmp, 'cache.sock'))
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        os.rmdir(self.tmp)
+
+    def test_fetch(self):
+        clients = [DaemonClient(self.server.address) for _ in range(3)]
+        for client in clients:
+            devices = client.fetch()
+            self.assertEqual(devices[0].dev_name, 'Lamp')
+            self.assertEqual(devices[0].rooms, ('Homebridge', 'Kitchen'))
+            self.assertEqual(devices[0].sets, ('pct',))
+            client.close()
+        # one request to FHEM for all units
+        self.assertEqual(self.fetches, 1)
+
+    def test_events(self):
+        client = DaemonClient(self.server.address)
+        first = client.fetch()
+        self.assertIs(client.fetch(), first)
+        # as FhemEventQueue(raw_value=True) reports "... lamp on",
+        # "... lamp pct: 50" and "... lamp rssi: -60"
+        self.server.apply_event({'device': 'lamp', 'devicetype': 'HUEDevice',
+                                 'reading': 'STATE', 'value': 'on',
+                                 'unit': ''})
+        self.server.apply_event({'device': 'lamp', 'devicetype': 'HUEDevice',
+                                 'reading': 'pct', 'value': 'pct: 50',
+                                 'unit': ''})
+        self.server.apply_event({'device': 'lamp', 'devicetype': 'HUEDevice',
+                                 'reading': 'rssi', 'value': 'rssi: -60',
+                                 'unit': ''})
+        lamp = client.fetch()[0]
+        self.assertEqual(lamp.state, 'on')
+        self.assertEqual(lamp.readings['pct'], '50')
+        self.assertEqual(self.server.version(), '1.2')
+        client.close()
+
+    def test_unchanged_sync(self):
+        records = [project(lamp)]
+        server = CacheServer(DeviceCache(lambda: records, ttl=60), '7000')
+        version = server.version()
+        # DeltaSync returns the same records when nothing changed
+        server.cache.refresh()
+        self.assertEqual(server.version(), version)
+        records[0] = project(lamp)
+        server.cache.refresh()
+        self.assertNotEqual(server.version(), version)
+
+    def test_unreachable(self):
+        client = DaemonClient(os.path.join(self.tmp, 'missing.sock'))
+        self.assertRaises(ConnectionError, client.fetch)
+        self.assertFalse(client.ping())
+
+    def test_ping(self):
+        client = DaemonClient(self.server.address)
+        self.assertTrue(client.ping())
+        # answered by the daemon, FHEM is not asked
+        self.assertEqual(self.fetches, 0)
+        client.close()
+
+    def test_truncated_reply(self):
+        class Sock(object):
+            def sendall(self, data):
+                pass
+
+            def close(self):
+                pass
+
+        class Truncated(DaemonClient):
+            def _connect(self):
+                self._sock = Sock()
+                self._file = io.BytesIO(b'{"version": "1.0", "dev\n')
+        self.assertRaises(ConnectionError, Truncated('7000').fetch)
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address('/run/fhem.sock'),
+                         (socket.AF_UNIX, '/run/fhem.sock'))
+        self.assertEqual(parse_address('7000'),
+                         (socket.AF_INET, ('127.0.0.1', 7000)))
+        self.assertEqual(parse_address('10.0.0.2:7000'),
+                         (socket.AF_INET, ('10.0.0.2', 7000)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+from unittest import TestCase
+import unittest
+
+from fhemskill.cache import DeviceCache
+from fhemskill.dimmer import (adjust_level, dim_command, dim_value,
+                              level_max, parse_level)
+from fhemskill.records import project
+
+lamp = {'Name': 'kitchen_lamp',
+        'PossibleSets': 'on off pct:slider,0,1,100 toggle',
+        'Readings': {'state': {'Value': 'on', 'Time': ''}},
+        'Attributes': {'genericDeviceType': 'light',
+                       'room': 'Homebridge,Kitchen'}}
+
+dimmer = {'Name': 'hall_dimmer',
+          'Readings': {'state': {'Value': 'dim40%', 'Time': ''},
+                       'dim': {'Value': '40 %', 'Time': ''}},
+          'Attributes': {'genericDeviceType': 'light', 'room': 'Homebridge'}}
+
+bulb = {'Name': 'milight',
+        'PossibleSets': 'on off brightness:slider,0,1,254',
+        'Readings': {'state': {'Value': 'on', 'Time': ''},
+                     'brightness': {'Value': '127', 'Time': ''}},
+        'Attributes': {'genericDeviceType': 'light', 'room': 'Homebridge'}}
+
+switch = {'Name': 'hall_switch',
+          'Readings': {'state': {'Value': 'off', 'Time': ''}},
+          'Attributes': {'genericDeviceType': 'switch', 'room': 'Homebridge'}}
+
+
+class TestDimmer(TestCase):
+
+    def test_parse_level(self):
+        self.assertEqual(parse_level('50'), 50)
+        self.assertEqual(parse_level('dim40%'), 40)
+        self.assertEqual(parse_level('120'), 100)
+        self.assertIsNone(parse_level('on'))
+
+    def test_dim_command(self):
+        self.assertEqual(dim_command(project(dimmer)), ('dim', 40))
+        self.assertEqual(dim_command(project(lamp)), ('pct', None))
+        self.assertEqual(dim_command(project(switch)), (None, None))
+
+    def test_brightness_range(self):
+        record = project(bulb)
+        self.assertEqual(level_max(record, 'brightness'), 254)
+        self.assertEqual(dim_command(record), ('brightness', 50))
+        self.assertEqual(dim_value(100, 254), 254)
+        self.assertEqual(dim_value(50, level_max(record, 'brightness')), 127)
+        # without a slider brightness is taken to go up to 255
+        del record.extra['brightness_max']
+        self.assertEqual(level_max(record, 'brightness'), 255)
+        self.assertEqual(level_max(project(lamp), 'pct'), 100)
+
+    def test_adjust_level(self):
+        self.assertEqual(adjust_level(40, 20, True), 60)
+        self.assertEqual(adjust_level(95, 20, True), 100)
+        self.assertEqual(adjust_level(10, 20, False), 0)
+
+
+class TestDeviceCache(TestCase):
+
+    def setUp(self):
+        self.fetches = 0
+        self.now = 0
+
+        def fetch():
+            self.fetches += 1
+            return [project(d) for d in (lamp, dimmer, switch)]
+        self.cache = DeviceCache(fetch, ttl=60, clock=lambda: self.now)
+
+    def test_filter(self):
+        names = [d.name for d in self.cache.filter('(light|switch)')]
+        self.assertEqual(sorted(names),
+                         ['hall_dimmer', 'hall_switch', 'kitchen_lamp'])
+        names = [d.name for d in self.cache.filter('light', 'kitchen')]
+        self.assertEqual(names, ['kitchen_lamp'])
+        self.assertEqual(self.cache.filter('lig'), [])
+
+    def test_ttl(self):
+        self.cache.get('hall_dimmer')
+        self.cache.filter('light')
+        self.assertEqual(self.fetches, 1)
+        self.now = 61
+        self.cache.get('hall_dimmer')
+        self.assertEqual(self.fetches, 2)
+
+    def test_set_reading(self):
+        self.cache.devices()
+        self.cache.set_reading('hall_dimmer', 'dim', '60')
+        self.assertEqual(dim_command(self.cache.get('hall_dimmer')),
+                         ('dim', 60))
+
+
+if __name__ == '__main__':
+    unittest.main()
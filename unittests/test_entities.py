@@ -0,0 +1,71 @@
+from unittest import TestCase
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from fhemskill.entities import NameIndex, write_entity
+from fhemskill.names import normalize
+from fhemskill.records import DeviceRecord
+
+devices = [
+    DeviceRecord('KitchenLight', alias='Ceiling Light', rooms=('Kitchen',),
+                 generic_type='light'),
+    DeviceRecord('BedroomLight', alias='Ceiling Light', rooms=('Bedroom',),
+                 generic_type='light'),
+    DeviceRecord('coffee_machine', rooms=('Kitchen',),
+                 generic_type='switch'),
+    # e.g. the fallback device or a LightScene
+    DeviceRecord('talk2fhem', rooms=('System',), type='Talk2Fhem'),
+]
+
+
+def rooms_of(dev):
+    return [normalize(r) for r in dev.rooms]
+
+
+class TestNameIndex(TestCase):
+
+    def setUp(self):
+        self.index = NameIndex(devices, normalize, rooms_of)
+
+    def test_lookup(self):
+        light = re.compile('light')
+        self.assertEqual(self.index.lookup('kitchen light', light).name,
+                         'KitchenLight')
+        self.assertEqual(
+            self.index.lookup('coffee machine', re.compile('switch')).name,
+            'coffee_machine')
+        # wrong type
+        self.assertIsNone(self.index.lookup('coffee machine', light))
+        # the alias is ambiguous without a room
+        self.assertIsNone(self.index.lookup('ceiling light', light))
+        self.assertEqual(
+            self.index.lookup('ceiling light', light, 'bedroom').name,
+            'BedroomLight')
+
+    def test_entities(self):
+        self.assertEqual(self.index.names, ['bedroom light', 'ceiling light',
+                                            'coffee machine',
+                                            'kitchen light'])
+        self.assertEqual(self.index.rooms, ['bedroom', 'kitchen'])
+        self.assertIsNone(self.index.lookup('talk2fhem', re.compile('.*')))
+        same = NameIndex(list(reversed(devices)), normalize, rooms_of)
+        self.assertEqual(same.fingerprint(), self.index.fingerprint())
+        fewer = NameIndex(devices[:2], normalize, rooms_of)
+        self.assertNotEqual(fewer.fingerprint(), self.index.fingerprint())
+
+    def test_write_entity(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'en-us', 'device.entity')
+            write_entity(path, self.index.names)
+            with open(path) as f:
+                self.assertEqual(f.read().splitlines(), self.index.names)
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    unittest.main()
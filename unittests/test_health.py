@@ -0,0 +1,101 @@
+from unittest import TestCase
+import unittest
+
+from fhemskill.client import FhemClient
+from fhemskill.health import CircuitBreaker, Watchdog, CLOSED, OPEN, \
+    HALF_OPEN
+from fhemskill.metrics import MetricsRegistry
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class DownFhem(object):
+
+    def __init__(self):
+        self.up = False
+        self.sent = 0
+
+    def connected(self):
+        return self.up
+
+    def connect(self):
+        pass
+
+    def send_cmd(self, msg, timeout=10.0):
+        self.sent += 1
+        self.timeout = timeout
+        return b'' if self.up else None
+
+
+class TestCircuitBreaker(TestCase):
+
+    def test_backoff(self):
+        clock = Clock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=5,
+                                 max_reset_timeout=15, clock=clock)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+        clock.now = 5
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, HALF_OPEN)
+        # only one probe at a time
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.retry_at, 15)
+        clock.now = 15
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.retry_at, 30)
+        clock.now = 30
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.reset_timeout, 5)
+
+
+class TestFailFast(TestCase):
+
+    def test_client(self):
+        clock = Clock()
+        fhem = DownFhem()
+        client = FhemClient(fhem, MetricsRegistry(),
+                            breaker=CircuitBreaker(clock=clock), timeout=3)
+        client.send_cmd('set lamp on')
+        self.assertEqual(fhem.timeout, 3)
+        client.send_cmd('set lamp on')
+        self.assertFalse(client.available())
+        self.assertRaises(ConnectionError, client.send_cmd, 'set lamp on')
+        self.assertFalse(client.ping())
+        self.assertEqual(fhem.sent, 2)
+
+        recovered = []
+        watchdog = Watchdog(client.ping, 30,
+                            on_recover=lambda: recovered.append(True))
+        self.assertFalse(watchdog.check())
+        clock.now = 5
+        fhem.up = True
+        self.assertTrue(watchdog.check())
+        self.assertEqual(recovered, [True])
+        self.assertTrue(client.available())
+
+    def test_watchdog_after_failed_setup(self):
+        recovered = []
+        watchdog = Watchdog(lambda: True, 30, healthy=False,
+                            on_recover=lambda: recovered.append(True))
+        self.assertTrue(watchdog.check())
+        self.assertTrue(watchdog.check())
+        self.assertEqual(recovered, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
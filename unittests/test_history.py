@@ -0,0 +1,106 @@
+from unittest import TestCase
+from array import array
+import datetime
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from fhemskill.history import (DbLogSource, FileLogSource, History,
+                               aggregate, period)
+
+LOG = """2019-05-01_08:00:00 th_greenhouse temperature: 14.5
+2019-05-01_14:00:00 th_greenhouse temperature: 27.0
+2019-05-01_14:00:00 th_greenhouse humidity: 60
+2019-05-01_14:05:00 th_garden temperature: 31.0
+2019-05-02_08:00:00 th_greenhouse temperature: 15.5
+2019-05-02_14:00:00 th_greenhouse temperature: 25.0 C
+2019-05-03_09:00:00 th_greenhouse temperature: 18.0
+2019-05-03_09:05:00 th_greenhouse temperature: ???
+"""
+
+day = datetime.date
+
+
+class CountingSource(object):
+
+    def __init__(self, source):
+        self.source = source
+        self.scans = []
+
+    def day_stats(self, device, reading, first, last):
+        self.scans.append((first, last))
+        return self.source.day_stats(device, reading, first, last)
+
+
+class TestHistory(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        with open(os.path.join(self.tmp, 'th-2019-05.log'), 'w') as f:
+            f.write(LOG)
+        self.filelog = FileLogSource(os.path.join(self.tmp, '*.log'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_filelog(self):
+        stats = self.filelog.day_stats('th_greenhouse', 'temperature',
+                                       day(2019, 5, 1), day(2019, 5, 2))
+        self.assertEqual(sorted(stats), [day(2019, 5, 1), day(2019, 5, 2)])
+        self.assertEqual(stats[day(2019, 5, 1)].max, 27.0)
+        self.assertEqual(stats[day(2019, 5, 2)].mean, 20.25)
+
+    def test_dblog(self):
+        path = os.path.join(self.tmp, 'fhem.db')
+        db = sqlite3.connect(path)
+        db.execute("CREATE TABLE history (TIMESTAMP TEXT, DEVICE TEXT, "
+                   "TYPE TEXT, EVENT TEXT, READING TEXT, VALUE TEXT, "
+                   "UNIT TEXT)")
+        for line in LOG.splitlines():
+            ts, dev, event = line.split(' ', 2)
+            reading, value = event.split(': ')
+            db.execute("INSERT INTO history VALUES (?, ?, '', ?, ?, ?, '')",
+                       (ts.replace('_', ' '), dev, event, reading,
+                        value.split(' ')[0]))
+        db.commit()
+        db.close()
+        stats = DbLogSource(path).day_stats(
+            'th_greenhouse', 'temperature', day(2019, 5, 1), day(2019, 5, 3))
+        self.assertEqual(stats, self.filelog.day_stats(
+            'th_greenhouse', 'temperature', day(2019, 5, 1), day(2019, 5, 3)))
+
+    def test_cached_days(self):
+        source = CountingSource(self.filelog)
+        history = History(source, today=lambda: day(2019, 5, 3))
+        week = history.stats('th_greenhouse', 'temperature',
+                             day(2019, 4, 29), day(2019, 5, 3))
+        self.assertEqual((week.min, week.max, week.count), (14.5, 27.0, 5))
+        self.assertEqual(len(source.scans), 1)
+        # past days are cached, only today is scanned again
+        history.stats('th_greenhouse', 'temperature',
+                      day(2019, 5, 1), day(2019, 5, 3))
+        self.assertEqual(source.scans[-1], (day(2019, 5, 3), day(2019, 5, 3)))
+        history.stats('th_greenhouse', 'temperature',
+                      day(2019, 5, 1), day(2019, 5, 2))
+        self.assertEqual(len(source.scans), 2)
+        self.assertIsNone(history.stats('th_greenhouse', 'pressure',
+                                        day(2019, 5, 1), day(2019, 5, 3)))
+
+    def test_aggregate(self):
+        values = array('d', range(100))
+        self.assertEqual(aggregate(values), (0, 99, 4950, 100))
+        self.assertIsNone(aggregate(array('d')))
+
+    def test_period(self):
+        thursday = day(2019, 5, 2)
+        self.assertEqual(period('today', thursday), (thursday, thursday))
+        self.assertEqual(period('week', thursday),
+                         (day(2019, 4, 29), thursday))
+        self.assertEqual(period('month', thursday),
+                         (day(2019, 5, 1), thursday))
+
+
+if __name__ == '__main__':
+    unittest.main()
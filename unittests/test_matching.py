@@ -0,0 +1,102 @@
+from unittest import TestCase
+import unittest
+
+from fhemskill.cache import DeviceCache
+from fhemskill.entities import NameIndex
+from fhemskill.matching import (SCORING, match_device, match_person,
+                                remove_words, room_bonus)
+from fhemskill.names import normalize
+from fhemskill.records import DeviceRecord
+
+devices = [
+    DeviceRecord('hue_kitchen', alias='Kitchen Lamp',
+                 rooms=('Homebridge', 'Kitchen'), generic_type='light'),
+    DeviceRecord('hue_living', alias='Ceiling Light',
+                 rooms=('Homebridge', 'Living Room'), generic_type='light'),
+    DeviceRecord('hue_bedroom', alias='Ceiling Light',
+                 rooms=('Homebridge', 'Bedroom'), generic_type='light'),
+    DeviceRecord('BedsideLamp', rooms=('Homebridge', 'Bedroom'),
+                 generic_type='light'),
+    DeviceRecord('sw_coffee', alias='Coffee Machine',
+                 rooms=('Homebridge', 'Kitchen'), generic_type='switch'),
+    DeviceRecord('rr_Anna', rooms=('Homebridge',), type='ROOMMATE',
+                 extra={'realname': 'Anna'}),
+    DeviceRecord('rr_Hannah', rooms=('Homebridge',), type='ROOMMATE',
+                 extra={'realname': 'Hannah'}),
+]
+
+LIGHTS = '(light|switch)'
+
+
+def rooms_of(dev):
+    return [r.lower() for r in dev.rooms if r != 'Homebridge']
+
+
+class TestMatchDevice(TestCase):
+
+    def setUp(self):
+        self.cache = DeviceCache(lambda: devices)
+        self.index = NameIndex(devices, normalize, rooms_of)
+
+    def match(self, device, room='', scoring=SCORING):
+        return match_device(device, LIGHTS, room, self.cache, rooms_of,
+                            self.index, ['the', 'in'], scoring)
+
+    def test_room(self):
+        dc, score, how = match_device('light', 'light', 'the kitchen',
+                                      self.cache, rooms_of, self.index,
+                                      ['the'])
+        self.assertEqual((dc.name, score, how), ('hue_kitchen', 999, 'room'))
+
+    def test_exact(self):
+        match = self.match('coffee machine')
+        self.assertEqual((match.record.name, match.how),
+                         ('sw_coffee', 'exact'))
+        # the alias is ambiguous without the room
+        match = self.match('ceiling light', 'in the bedroom')
+        self.assertEqual((match.record.name, match.how),
+                         ('hue_bedroom', 'exact'))
+
+    def test_fuzzy(self):
+        match = self.match('coffee maker')
+        self.assertEqual((match.record.name, match.how),
+                         ('sw_coffee', 'fuzzy'))
+        self.assertGreater(match.score, SCORING.min_score)
+        self.assertEqual(self.match('bed side lamp').record.name,
+                         'BedsideLamp')
+
+    def test_no_match(self):
+        self.assertEqual(self.match('garage door'), (None, 0, None))
+        # a lower threshold takes whatever comes closest
+        lax = SCORING._replace(min_score=10)
+        self.assertIsNotNone(self.match('garage door', scoring=lax).record)
+
+    def test_room_bonus(self):
+        self.assertEqual(room_bonus('kitchen', 'kitchen'), SCORING.bonus)
+        self.assertEqual(room_bonus('kitchen', 'bedroom'), 0)
+        strict = SCORING._replace(required_ratio_for_bonus=100)
+        self.assertEqual(room_bonus('kitchen', 'kitchen', strict), 0)
+
+    def test_remove_words(self):
+        self.assertEqual(remove_words('in the living room', ['in', 'the']),
+                         'living room')
+        self.assertEqual(remove_words('the  hall', ['the']), 'hall')
+
+
+class TestMatchPerson(TestCase):
+
+    def test_realname(self):
+        self.assertEqual(match_person('anne', devices).record.name,
+                         'rr_Anna')
+        self.assertEqual(match_person('Hanna', devices).record.name,
+                         'rr_Hannah')
+        self.assertIsNone(match_person('tom', devices).record)
+
+    def test_ratio(self):
+        strict = SCORING._replace(presence_ratio=80)
+        self.assertIsNone(match_person('anne', devices, strict).record)
+        self.assertEqual(match_person('anna', devices, strict).score, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+from unittest import TestCase
+import json
+import unittest
+from urllib.request import urlopen
+
+from fhemskill.client import FhemClient
+from fhemskill.metrics import MetricsRegistry, MetricsServer, \
+    render_json, render_prometheus
+
+
+class FakeFhem(object):
+
+    def __init__(self):
+        self.up = True
+
+    def connected(self):
+        return self.up
+
+    def connect(self):
+        pass
+
+    def send_cmd(self, msg):
+        return b''
+
+    def get(self, **kwargs):
+        return [] if kwargs.get('room') == 'empty' else [{'Name': 'lamp'}]
+
+    def get_internals(self, name):
+        return {name: {}}
+
+
+class TestMetrics(TestCase):
+
+    def test_prometheus(self):
+        registry = MetricsRegistry()
+        registry.counter('req_total', 'Requests',
+                         labelnames=('outcome',)).labels(outcome='ok').inc(2)
+        registry.gauge('devices', 'Devices', func=lambda: 7)
+        registry.histogram('t_seconds', 'Time', buckets=(1.0,)).observe(0.5)
+        text = render_prometheus(registry)
+        self.assertIn('# TYPE req_total counter\n', text)
+        self.assertIn('req_total{outcome="ok"} 2.0\n', text)
+        self.assertIn('devices 7.0\n', text)
+        self.assertIn('t_seconds_bucket{le="1.0"} 1.0\n', text)
+        self.assertIn('t_seconds_bucket{le="+Inf"} 1.0\n', text)
+        self.assertIn('t_seconds_count 1.0\n', text)
+        data = json.loads(render_json(registry))
+        self.assertEqual(data['metrics']['devices'][0]['value'], 7)
+
+    def test_histogram(self):
+        registry = MetricsRegistry()
+        h = registry.histogram('t', buckets=(0.1, 1.0))
+        for v in [0.05, 0.5, 0.5, 3]:
+            h.observe(v)
+        self.assertEqual(h.counts, [1, 2, 1])
+        self.assertEqual(h.count, 4)
+        self.assertAlmostEqual(h.mean(), 1.0125)
+        self.assertIs(registry.histogram('t'), h)
+
+    def test_server(self):
+        registry = MetricsRegistry()
+        registry.counter('c_total', 'C').inc()
+        server = MetricsServer(registry, 0)
+        server.start()
+        try:
+            url = 'http://127.0.0.1:{}/metrics'.format(server.port)
+            body = urlopen(url).read().decode('utf-8')
+            self.assertIn('c_total 1.0', body)
+        finally:
+            server.stop()
+
+    def test_client(self):
+        registry = MetricsRegistry()
+        fhem = FakeFhem()
+        client = FhemClient(fhem, registry)
+        client.get(room='Homebridge')
+        client.get(room='empty')
+        client.send_cmd('set lamp on')
+        fhem.up = False
+        client.send_cmd('set lamp on')
+        client.connect()
+        self.assertEqual(client.get_internals('lamp'), {'lamp': {}})
+        requests = registry.counter('fhem_requests_total')
+        self.assertEqual(
+            requests.labels(method='get', outcome='ok').value, 1)
+        self.assertEqual(
+            requests.labels(method='get', outcome='empty').value, 1)
+        self.assertEqual(
+            requests.labels(method='send_cmd', outcome='ok').value, 1)
+        self.assertEqual(
+            requests.labels(method='send_cmd', outcome='error').value, 1)
+        self.assertEqual(registry.counter('fhem_connects_total').value, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+from unittest import TestCase
+import datetime
+import unittest
+
+from fhemskill.events import parse_event
+from fhemskill.notify import Notifier, Rule, parse_quiet_hours
+from fhemskill.records import DeviceRecord
+
+devices = {
+    'front_door': DeviceRecord('front_door', alias='Front Door',
+                               rooms=('Homebridge', 'Hall'),
+                               generic_type='contact'),
+    'win_bath': DeviceRecord('win_bath', alias='Bathroom Window',
+                             rooms=('Homebridge', 'Bathroom'),
+                             generic_type='window'),
+    'heating': DeviceRecord('heating', readings={'state': 'on'},
+                            generic_type='thermostat'),
+    'washer': DeviceRecord('washer', generic_type='outlet'),
+}
+
+rules = [
+    {'device': 'front_door', 'value': 'open', 'say': 'front door opened'},
+    {'type': 'window', 'value': 'open', 'say': '{dev_name} open',
+     'while': {'device': 'heating', 'value': 'on'}},
+    {'device': 'washer', 'reading': 'power', 'below': 3, 'debounce': 600,
+     'say': 'washing machine finished', 'urgent': True},
+    {'room': 'bathroom', 'reading': 'humidity', 'above': 80,
+     'say': 'open the bathroom window'},
+]
+
+
+def event(device, value, reading='state'):
+    # like FhemEventQueue(raw_value=True) reports the event line
+    # "<time> CUL_HM <device> [<reading>: ]<value>"
+    if reading == 'state':
+        return {'device': device, 'devicetype': 'CUL_HM',
+                'reading': 'STATE', 'value': value, 'unit': ''}
+    return {'device': device, 'devicetype': 'CUL_HM', 'reading': reading,
+            'value': '{}: {}'.format(reading, value), 'unit': ''}
+
+
+class TestNotifier(TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.time = datetime.datetime(2019, 5, 1, 12, 0)
+        self.spoken = []
+        self.notifier = Notifier(
+            [Rule.from_dict(r) for r in rules], devices.get,
+            self.spoken.append,
+            quiet_hours=parse_quiet_hours('22:00-07:00'),
+            clock=lambda: self.now, now=lambda: self.time)
+
+    def test_transitions(self):
+        self.notifier.handle(event('front_door', 'open'))
+        # repeated state events are not a new occurrence
+        self.notifier.handle(event('front_door', 'open'))
+        self.notifier.handle(event('front_door', 'closed'))
+        self.now = 100
+        self.notifier.handle(event('front_door', 'open'))
+        self.assertEqual(self.spoken, ['front door opened'] * 2)
+
+    def test_debounce(self):
+        for watts in ('120', '2.5 W', '150', '1.0 W'):
+            self.notifier.handle(event('washer', watts, 'power'))
+        self.assertEqual(self.spoken, ['washing machine finished'])
+
+    def test_condition(self):
+        self.notifier.handle(event('win_bath', 'open'))
+        self.assertEqual(self.spoken, ['Bathroom Window open'])
+        devices['heating'].readings = {'state': 'off'}
+        try:
+            self.notifier.handle(event('win_bath', 'closed'))
+            self.notifier.handle(event('win_bath', 'open'))
+        finally:
+            devices['heating'].readings = {'state': 'on'}
+        self.assertEqual(len(self.spoken), 1)
+
+    def test_room_and_quiet_hours(self):
+        self.time = datetime.datetime(2019, 5, 1, 23, 30)
+        self.notifier.handle(event('win_bath', '85', 'humidity'))
+        self.notifier.handle(event('washer', '0', 'power'))
+        self.assertEqual(self.spoken, ['washing machine finished'])
+        self.time = datetime.datetime(2019, 5, 1, 8, 0)
+        self.notifier.handle(event('win_bath', '70', 'humidity'))
+        self.notifier.handle(event('win_bath', '82', 'humidity'))
+        self.assertEqual(self.spoken[-1], 'open the bathroom window')
+
+    def test_readings(self):
+        self.assertEqual(self.notifier.readings,
+                         {'state', 'power', 'humidity'})
+
+    def test_unrelated(self):
+        self.assertEqual(self.notifier.handle(event('lamp', 'on')), [])
+        self.assertEqual(self.notifier.handle(
+            event('front_door', 'open', 'battery')), [])
+
+
+class TestParseEvent(TestCase):
+
+    def test_parse_event(self):
+        self.assertEqual(parse_event(event('washer', '2.5 W', 'power')),
+                         ('washer', 'power', '2.5 W'))
+        self.assertEqual(
+            parse_event(event('heating', 'T: 21.0 desired: 21.0')),
+            ('heating', 'state', 'T: 21.0 desired: 21.0'))
+        # without raw_value only the number is reported
+        self.assertEqual(parse_event({'device': 'washer', 'reading': 'power',
+                                      'value': 2.5, 'unit': 'W'}),
+                         ('washer', 'power', 2.5))
+
+
+if __name__ == '__main__':
+    unittest.main()
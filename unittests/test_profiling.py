@@ -0,0 +1,61 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+import unittest
+
+from fhemskill.profiling import Profiler, parse_options, profiled
+
+
+class Skill(object):
+
+    def __init__(self, directory, rand):
+        self.profiler = Profiler(directory, rand=rand)
+
+    @profiled
+    def handle_status_intent(self, message):
+        return [str(i) for i in range(1000)][-1] + message
+
+
+class TestProfiler(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_count(self):
+        skill = Skill(self.dir, rand=lambda: 0.0)
+        self.assertEqual(skill.handle_status_intent('!'), '999!')
+        self.assertEqual(os.listdir(self.dir), [])
+        skill.profiler.start(2)
+        for i in range(3):
+            self.assertEqual(skill.handle_status_intent('!'), '999!')
+        self.assertFalse(skill.profiler.active)
+        files = os.listdir(self.dir)
+        self.assertEqual(len([f for f in files if f.endswith('.prof')]), 2)
+        report = [f for f in files if f.endswith('.txt')][0]
+        with open(os.path.join(self.dir, report)) as f:
+            text = f.read()
+        self.assertIn('handle_status_intent took', text)
+        self.assertIn('Top allocation sites', text)
+
+    def test_sampling(self):
+        skill = Skill(self.dir, rand=lambda: 0.5)
+        skill.profiler.start(5, sample_rate=0.1)
+        skill.handle_status_intent('!')
+        self.assertEqual(skill.profiler.remaining, 5)
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def test_parse_options(self):
+        self.assertEqual(parse_options('10', '0.1'), (10, 0.1))
+        self.assertEqual(parse_options('5', 0), (5, 0.0))
+        self.assertEqual(parse_options('5', ''), (5, 1.0))
+        self.assertEqual(parse_options(None, None), (0, 1.0))
+        self.assertIsNone(parse_options('ten', None))
+        self.assertIsNone(parse_options({'a': 1}, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
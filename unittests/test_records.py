@@ -0,0 +1,59 @@
+from unittest import TestCase
+import unittest
+
+from fhemskill.records import project
+
+thermostat = {
+    'Name': 'hm_heating',
+    'PossibleSets': 'desired-temp:slider,4.5,0.5,30.5 controlMode:auto',
+    'Internals': {'TYPE': 'CUL_HM', 'NR': '42', 'channel_04': 'hm_clima'},
+    'Readings': {'state': {'Value': 'T: 21.0', 'Time': '2019-05-01'},
+                 'desired-temp': {'Value': '21.0', 'Time': '2019-05-01'},
+                 'R-sign': {'Value': 'on', 'Time': '2019-05-01'}},
+    'Attributes': {'alias': 'Heating', 'room': 'Homebridge,Bathroom',
+                   'genericDeviceType': 'thermostat', 'icon': 'sani'}}
+
+roommate = {
+    'Name': 'rr_Anna',
+    'Internals': {'TYPE': 'ROOMMATE'},
+    'Readings': {'presence': {'Value': 'present', 'Time': ''}},
+    'Attributes': {'rr_realname': 'group', 'group': 'Anna',
+                   'room': 'Homebridge'}}
+
+
+class TestProject(TestCase):
+
+    def test_fields(self):
+        rec = project(thermostat)
+        self.assertEqual(rec.name, 'hm_heating')
+        self.assertEqual(rec.dev_name, 'Heating')
+        self.assertEqual(rec.rooms, ('Homebridge', 'Bathroom'))
+        self.assertEqual(rec.generic_type, 'thermostat')
+        self.assertEqual(rec.type, 'CUL_HM')
+        self.assertEqual(rec.state, 'T: 21.0')
+        self.assertEqual(rec.readings, {'state': 'T: 21.0',
+                                        'desired-temp': '21.0'})
+        self.assertEqual(rec.get('channel_04'), 'hm_clima')
+        self.assertIsNone(rec.get('REGEXP'))
+
+    def test_kept_readings(self):
+        rec = project(thermostat, ('state', 'R-sign'))
+        self.assertEqual(rec.readings, {'state': 'T: 21.0', 'R-sign': 'on'})
+
+    def test_minimal(self):
+        rec = project({'Name': 'dummy'})
+        self.assertEqual(rec.dev_name, 'dummy')
+        self.assertEqual(rec.state, '')
+        self.assertEqual(rec.rooms, ())
+        self.assertIsNone(rec.extra)
+        with self.assertRaises(AttributeError):
+            rec.foo = 1
+
+    def test_realname(self):
+        rec = project(roommate)
+        self.assertEqual(rec.get('realname'), 'Anna')
+        self.assertEqual(rec.readings['presence'], 'present')
+
+
+if __name__ == '__main__':
+    unittest.main()
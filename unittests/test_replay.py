@@ -0,0 +1,39 @@
+from unittest import TestCase
+import importlib.util
+import unittest
+
+from benchmarks.replay import FakeFhem, load_fixtures
+from fhemskill.sync import DeltaSync
+
+HAVE_MYCROFT = importlib.util.find_spec('mycroft') is not None and \
+    importlib.util.find_spec('fhem') is not None
+
+
+class TestReplay(TestCase):
+
+    def setUp(self):
+        self.fixtures = load_fixtures()
+
+    def test_fixtures(self):
+        fhem = FakeFhem()
+        fhem.latency = 0
+        sync = DeltaSync(fhem.send_cmd, 'room=Homebridge', delta=False)
+        names = [d.name for d in sync.fetch()]
+        self.assertIn('rr_Anna', names)
+        for fixture in self.fixtures:
+            self.assertTrue(fixture['utterance'])
+            self.assertTrue(fixture['expected_dialog'])
+
+    @unittest.skipUnless(HAVE_MYCROFT, "needs mycroft-core and python_fhem")
+    def test_short_replay(self):
+        from benchmarks.replay import load_skill, replay, report
+        skill = load_skill()
+        skill._setup(force=True)
+        results, elapsed = replay(skill, self.fixtures, threads=4, rounds=5,
+                                  swap=True)
+        self.assertEqual(len(results), 20)
+        self.assertEqual(report(results, elapsed), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
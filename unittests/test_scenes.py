@@ -0,0 +1,65 @@
+from unittest import TestCase
+import unittest
+
+from fhemskill.records import project
+from fhemskill.scenes import SceneIndex
+
+devices = [
+    {'Name': 'ls_living', 'PossibleSets': 'scene:movie,Dinner_Time remove',
+     'Internals': {'TYPE': 'LightScene'},
+     'Attributes': {'room': 'Homebridge,Living Room'}},
+    {'Name': 'ls_bedroom', 'PossibleSets': 'scene:movie,reading',
+     'Internals': {'TYPE': 'LightScene'},
+     'Attributes': {'room': 'Homebridge,Bedroom'}},
+    {'Name': 'st_upstairs', 'Internals': {'TYPE': 'structure'},
+     'Attributes': {'alias': 'Everything Upstairs', 'room': 'Homebridge'}},
+    {'Name': 'di_wakeup', 'Internals': {'TYPE': 'DOIF'},
+     'Attributes': {'alias': 'WakeUp', 'room': 'Homebridge'}},
+    {'Name': 'n_party', 'Internals': {'TYPE': 'notify',
+                                      'REGEXP': 'partyDummy:on'},
+     'Attributes': {'alias': 'party mode', 'room': 'Homebridge'}},
+    {'Name': 'n_complex', 'Internals': {'TYPE': 'notify',
+                                        'REGEXP': 'win.*:open'},
+     'Attributes': {'room': 'Homebridge'}},
+    {'Name': 'lamp', 'Internals': {'TYPE': 'HUEDevice'},
+     'Attributes': {'room': 'Homebridge'}},
+]
+
+
+def rooms_of(dev):
+    return [r.lower() for r in dev.rooms if r != 'Homebridge']
+
+
+class TestSceneIndex(TestCase):
+
+    def setUp(self):
+        self.index = SceneIndex([project(d) for d in devices], rooms_of)
+
+    def test_commands(self):
+        self.assertEqual(self.index.lookup('dinner time').cmd,
+                         'set ls_living scene Dinner_Time')
+        self.assertEqual(self.index.lookup('everything upstairs').cmd,
+                         'set st_upstairs on')
+        self.assertEqual(self.index.lookup('wake up').cmd,
+                         'set di_wakeup cmd_1')
+        self.assertEqual(self.index.lookup('party mode').cmd,
+                         'trigger partyDummy on')
+        self.assertIsNone(self.index.lookup('n complex'))
+        self.assertIsNone(self.index.lookup('lamp'))
+
+    def test_room(self):
+        self.assertEqual(self.index.lookup('movie', 'bedroom').name,
+                         'ls_bedroom')
+        self.assertEqual(self.index.lookup('movie living room',
+                                           'bedroom').name, 'ls_living')
+        self.assertEqual(self.index.lookup('movie', 'kitchen').room,
+                         'living room')
+
+    def test_names(self):
+        self.assertEqual(sorted(self.index.names()),
+                         ['dinner time', 'everything upstairs', 'movie',
+                          'party mode', 'reading', 'wake up'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+from unittest import TestCase
+import threading
+import unittest
+
+from fhemskill.state import DISCONNECTED, SharedState, pinned
+
+
+class Handler(object):
+
+    def __init__(self):
+        self.state = SharedState()
+
+    @pinned
+    def handle(self, started, resume):
+        first = self.state.current()
+        started.set()
+        resume.wait()
+        return first, self.state.current()
+
+
+class TestSharedState(TestCase):
+
+    def test_swap(self):
+        state = SharedState()
+        self.assertIs(state.current(), DISCONNECTED)
+        state.update(device_location='kitchen')
+        self.assertEqual(state.current().device_location, 'kitchen')
+        self.assertEqual(DISCONNECTED.device_location, '')
+
+    def test_pinned_handler(self):
+        handler = Handler()
+        started, resume = threading.Event(), threading.Event()
+        result = []
+        thread = threading.Thread(
+            target=lambda: result.append(handler.handle(started, resume)))
+        thread.start()
+        started.wait()
+        # the settings change while the handler runs
+        handler.state.update(fhem='new client')
+        resume.set()
+        thread.join()
+        first, later = result[0]
+        self.assertIs(first, later)
+        self.assertIsNone(later.fhem)
+        self.assertEqual(handler.state.current().fhem, 'new client')
+
+    def test_own_swap(self):
+        state = SharedState()
+        with state.pin():
+            state.update(fhem='client')
+            self.assertEqual(state.current().fhem, 'client')
+        self.assertEqual(state.current().fhem, 'client')
+
+
+if __name__ == '__main__':
+    unittest.main()
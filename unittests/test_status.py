@@ -0,0 +1,48 @@
+from unittest import TestCase
+import unittest
+
+from fhemskill.records import DeviceRecord
+from fhemskill.status import collect, majority, parse_state, ranges
+
+
+def record(name, state, generic_type='contact'):
+    return DeviceRecord(name, generic_type=generic_type,
+                        readings={'state': state})
+
+
+class TestStatus(TestCase):
+
+    def test_parse_state(self):
+        self.assertEqual(parse_state('T: 21.3 H: 45'),
+                         (('temperature', 21.3), ('humidity', 45.0)))
+        self.assertEqual(parse_state('21,5 °C'), (('value', 21.5),))
+        self.assertEqual(parse_state('closed'), ())
+
+    def test_majority(self):
+        windows = [record('w_{}'.format(i), 'closed') for i in range(20)]
+        windows.append(record('w_bath', 'open'))
+        readings, states = collect(windows)
+        self.assertEqual(readings, {})
+        state, exceptions = majority(states)
+        self.assertEqual(state, 'closed')
+        self.assertEqual([r.name for r in exceptions], ['w_bath'])
+        windows += [record('w_{}'.format(i), 'tilted') for i in range(3)]
+        self.assertIsNone(majority(collect(windows)[1]))
+
+    def test_ranges(self):
+        sensors = [record('th_kitchen', 'T: 21.0 H: 40', 'thermometer'),
+                   record('th_garden', 'T: 12.5 H: 80', 'thermometer'),
+                   record('th_bath', '24', 'thermometer')]
+        readings, states = collect(sensors)
+        self.assertEqual(states, {})
+        humidity, temperature = ranges(readings)
+        self.assertEqual(humidity.count, 2)
+        self.assertEqual((temperature.low_device.name, temperature.low),
+                         ('th_garden', 12.5))
+        self.assertEqual((temperature.high_device.name, temperature.high),
+                         ('th_bath', 24.0))
+        self.assertAlmostEqual(temperature.mean, 57.5 / 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+from unittest import TestCase
+import json
+import re
+import unittest
+
+from fhemskill.metrics import MetricsRegistry
+from fhemskill.sync import DeltaSync, iter_results
+
+
+class FakeServer(object):
+    """Answers jsonlist2 and the delta query like FHEM would."""
+
+    def __init__(self):
+        self.now = '2026-10-19 09:00:00'
+        self.version = 1
+        self.devices = {}
+        self.commands = []
+        self.perl = True
+        for name in ['lamp', 'window', 'heater']:
+            self.add(name)
+        self.now = '2026-10-19 10:00:00'
+
+    def add(self, name):
+        self.devices[name] = {'Name': name, 'Readings': {
+            'state': {'Value': 'off', 'Time': self.now}}}
+
+    def set(self, name, value):
+        self.devices[name]['Readings']['state'] = {'Value': value,
+                                                   'Time': self.now}
+
+    def send_cmd(self, cmd):
+        self.commands.append(cmd)
+        if cmd.startswith('{'):
+            if not self.perl:
+                return b'Forbidden command {.'
+            since = re.search(r'ge "([^"]*)"', cmd).group(1)
+            changed = [n for n, d in sorted(self.devices.items())
+                       if any(r['Time'] >= since
+                              for r in d['Readings'].values())]
+            return '\n'.join([self.now, str(self.version),
+                              str(len(self.devices)),
+                              ','.join(changed)]).encode('utf-8')
+        spec = cmd.split(' ', 1)[1]
+        names = self.devices.keys() if spec.startswith('room=') \
+            else spec.split(',')
+        return json.dumps({'Results': [self.devices[n] for n in names]})
+
+
+class TestDeltaSync(TestCase):
+
+    def setUp(self):
+        self.server = FakeServer()
+        self.metrics = MetricsRegistry()
+        self.sync = DeltaSync(self.server.send_cmd, 'room=Homebridge',
+                              metrics=self.metrics)
+
+    def states(self, devices):
+        return dict((d.name, d.state)
+                    for d in devices)
+
+    def test_delta(self):
+        self.assertEqual(len(self.sync.fetch()), 3)
+        self.server.now = '2026-10-19 10:00:03'
+        self.server.set('window', 'open')
+        self.server.now = '2026-10-19 10:00:05'
+        self.server.commands = []
+        devices = self.sync.fetch()
+        self.assertEqual(self.states(devices)['window'], 'open')
+        self.assertEqual(self.server.commands[1], 'jsonlist2 window')
+        self.server.now = '2026-10-19 10:00:10'
+        self.server.commands = []
+        self.sync.fetch()
+        # nothing changed since the last sync: only the query is sent
+        self.assertEqual(len(self.server.commands), 1)
+        syncs = self.metrics.counter('fhem_sync_total')
+        self.assertEqual(syncs.labels(mode='full').value, 1)
+        self.assertEqual(syncs.labels(mode='delta').value, 1)
+        self.assertEqual(syncs.labels(mode='unchanged').value, 1)
+        self.assertEqual(
+            self.metrics.counter('fhem_sync_devices_total').value, 4)
+
+    def test_structural_change(self):
+        self.sync.fetch()
+        self.server.now = '2026-10-19 10:00:05'
+        self.server.version = 2
+        self.server.commands = []
+        self.sync.fetch()
+        self.assertEqual(self.server.commands[1], 'jsonlist2 room=Homebridge')
+        self.server.add('door')
+        self.assertIn('door', self.states(self.sync.fetch()))
+
+    def test_no_perl(self):
+        self.server.perl = False
+        self.sync.fetch()
+        self.assertFalse(self.sync.delta_supported)
+        self.server.commands = []
+        self.assertEqual(len(self.sync.fetch()), 3)
+        self.assertEqual(self.server.commands, ['jsonlist2 room=Homebridge'])
+
+    def test_offline(self):
+        self.sync.fetch()
+        self.server.send_cmd = lambda cmd: None
+        self.sync._send_cmd = self.server.send_cmd
+        self.assertRaises(ConnectionError, self.sync.fetch)
+        self.assertTrue(self.sync.delta_supported)
+
+
+class TestIterResults(TestCase):
+
+    def test_like_json_loads(self):
+        doc = {'Arg': 'room=Homebridge', 'Results': [
+            {'Name': 'a', 'Readings': {'state': {'Value': 'on ]'}}},
+            {'Name': 'b', 'Attributes': {'alias': 'B \\"Results\\"'}}],
+            'totalResultsReturned': 2}
+        for text in (json.dumps(doc), json.dumps(doc, indent=2)):
+            self.assertEqual(list(iter_results(text)), doc['Results'])
+
+    def test_empty(self):
+        self.assertEqual(list(iter_results(
+            '{ "Arg":"x", "Results": [ ], "totalResultsReturned":0 }')), [])
+
+    def test_invalid(self):
+        for text in ('Unknown command jsonlist3', '{"Results": {}}',
+                     '{"Results": [{"Name": "a"} {"Name": "b"}]}',
+                     '{"Results": [{"Name": "a"},'):
+            with self.assertRaises(ValueError):
+                list(iter_results(text))
+
+
+if __name__ == '__main__':
+    unittest.main()